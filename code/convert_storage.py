@@ -0,0 +1,57 @@
+"""
+Convert DB files to the compact typed storage format (see StorageFormat in lab1_phone_DB.py)
+ContactsDB converts the old files on open as well, the tool also compacts the files (VACUUM)
+and reports the results
+Usage: python convert_storage.py DB_FILE [DB_FILE ...]
+"""
+import argparse
+import sqlite3
+from os import path
+from tabulate import tabulate as tb
+from lab1_phone_DB import ContactsDB, StorageFormat
+
+
+def storage_version(db_name: str) -> int:
+    connection = sqlite3.connect(db_name)
+    try:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def convert(db_name: str) -> tuple:
+    """
+    Convert and compact the DB file
+    :return: tuple(file name, old storage version, size before, size after,
+    number of birthdays and phone numbers left as text because they are incorrect)
+    """
+    version = storage_version(db_name)
+    size = path.getsize(db_name)
+    db = ContactsDB(db_name, auto_save=False)
+    if db._save() == -1:
+        db.__del__()
+        return db_name, version, size, "-", "-"
+    incorrect = db.SQL_connection.execute(
+        '''
+        SELECT (SELECT COUNT(*) FROM Persons WHERE typeof(birthday) = 'text')
+        + (SELECT COUNT(*) FROM Phones WHERE typeof(number) = 'text')
+        '''
+    ).fetchone()[0]
+    db.SQL_connection.execute("VACUUM")
+    db.__del__()
+    return db_name, version, size, path.getsize(db_name), incorrect
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ContactsDB files to the storage format "
+                                                 + str(StorageFormat.version))
+    parser.add_argument("files", nargs="+", help="DB files")
+    args = parser.parse_args()
+
+    rows = list()
+    for file_name in args.files:
+        if not path.isfile(file_name):
+            print("System: there is no file", file_name)
+            continue
+        rows.append(convert(file_name))
+    print(tb(rows, headers=("File", "Old format", "Size before", "Size after", "Left as text"), tablefmt='grid'))
@@ -1,15 +1,31 @@
 import sqlite3
 import keyboard
-from os import system, name
+import re
+import argparse
+import heapq
+from os import system, name, path, listdir, remove, makedirs
+from urllib.request import pathname2url
+from concurrent.futures import ProcessPoolExecutor, Future
 from tabulate import tabulate as tb
 import datetime
-from dateutil.relativedelta import relativedelta
+import threading
+import queue
+import itertools
+import random
+import time
+import difflib
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 def try_except_decorator(func):
     def wrapper(*args, **kwargs):
         try:
-            return func(*args, *kwargs)
+            return func(*args, **kwargs)
         except Exception as e:
             print(" *** ERROR *** : ", e, " in ", func.__name__)
             print("P.s. You may need to press [q] for exit\n")
@@ -17,49 +33,924 @@ def try_except_decorator(func):
     return wrapper
 
 
+def retry_on_lock(func):
+    """
+    Run ContactsDB write method in a savepoint of the current transaction (see ContactsDB._atomic):
+    a failed write leaves no partial changes, the changes stay unsaved until _save as usual
+    Transient lock errors are retried, see ContactsDB._retry_on_lock
+    """
+    def wrapper(self, *args, **kwargs):
+        def write():
+            with self._atomic():
+                return func(self, *args, **kwargs)
+        return self._retry_on_lock(write)
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+class PeriodicTask:
+    """
+    Calls the function every {interval} seconds in a background (daemon) thread
+    """
+
+    def __init__(self, interval: float, function):
+        self.__interval = interval
+        self.__function = function
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while not self.__stopped.wait(self.__interval):
+            self.__function()
+
+    def stop(self):
+        self.__stopped.set()
+
+
+class LiveSearch:
+    """
+    Search as you type: the latest search request is run in a background (daemon) thread
+    when no newer request comes for {delay} seconds, the running query which became stale
+    is cancelled by SQLite progress handler, the next page of the results is prefetched
+    """
+
+    def __init__(self, connection, search, on_result, delay=0.3, page_size=10):
+        """
+        :param connection: SQLite connection used by the search function (to cancel its queries)
+        :param search: function(search params, page, page size) -> list of rows
+        :param on_result: function(search params, page, rows) called with the results of the latest request
+        :param delay: debounce delay in seconds
+        :param page_size: rows per page
+        """
+        self.__connection = connection
+        self.__search = search
+        self.__on_result = on_result
+        self.__delay = delay
+        self.__page_size = page_size
+        self.__condition = threading.Condition()
+        # every new request increases the generation, queries of the previous generations are stale
+        self.__generation = 0
+        self.__request = None
+        # page number -> rows for the search params of the last request
+        self.__search_params = None
+        self.__prefetched = dict()
+        self.__stopped = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def submit(self, search_params: dict, page=0):
+        """
+        Request the page of the search results, all previous requests become stale
+        The prefetched page is passed to on_result at once
+        :param search_params: search params, see ContactsDB._read
+        :param page: page number starting from 0
+        :return: None
+        """
+        with self.__condition:
+            self.__generation += 1
+            if self.__search_params != search_params:
+                self.__search_params = search_params
+                self.__prefetched = dict()
+            self.__request = (self.__generation, search_params, page)
+            rows = self.__prefetched.get(page)
+            self.__condition.notify()
+        if rows is not None:
+            self.__on_result(search_params, page, rows)
+
+    def cancel(self):
+        """
+        Cancel the last request and the running query
+        :return: None
+        """
+        with self.__condition:
+            self.__generation += 1
+            self.__request = None
+            self.__search_params = None
+            self.__prefetched = dict()
+
+    def stop(self):
+        self.cancel()
+        with self.__condition:
+            self.__stopped = True
+            self.__condition.notify()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                self.__condition.wait_for(lambda: self.__request is not None or self.__stopped)
+                if self.__stopped:
+                    return
+                generation, search_params, page = self.__request
+                # debounce: a newer request replaces this one
+                if self.__condition.wait_for(lambda: self.__generation != generation or self.__stopped,
+                                             self.__delay):
+                    continue
+                self.__request = None
+                prefetched = self.__prefetched
+
+            if page not in prefetched:
+                rows = self.__query(generation, search_params, page)
+                if rows is None:
+                    continue
+                prefetched[page] = rows
+                with self.__condition:
+                    if generation != self.__generation:
+                        continue
+                self.__on_result(search_params, page, rows)
+            if page + 1 not in prefetched:
+                rows = self.__query(generation, search_params, page + 1)
+                if rows is not None:
+                    prefetched[page + 1] = rows
+
+    def __query(self, generation: int, search_params: dict, page: int):
+        """
+        Run the search, it is interrupted as soon as a newer request comes
+        :return: list of rows or None if the request became stale
+        """
+        self.__connection.set_progress_handler(
+            lambda: threading.current_thread() is self.__thread and self.__generation != generation, 1000)
+        try:
+            return self.__search(search_params, page, self.__page_size)
+        except sqlite3.Error as e:
+            if self.__generation == generation:
+                print(" *** ERROR *** : ", e, " in live search")
+            return None
+        finally:
+            self.__connection.set_progress_handler(None, 0)
+
+
+class BirthdayCalculator:
+    """
+    Batched computation of ages and days until the birthday for whole result sets
+    Birthdays are parsed once into integers and cached per person,
+    the arithmetic is vectorized with NumPy when it is installed
+    """
+
+    def __init__(self):
+        # person ID -> (birthday string, year, month, day)
+        self.__cache = dict()
+
+    def parse(self, person_id, birthday: str) -> tuple:
+        """
+        Parse birthday string {dd-mm-yyyy} once per person
+        :param person_id: ID of the birthday owner (cache key)
+        :param birthday: birthday string
+        :return: tuple(year, month, day); raises ValueError for incorrect date
+        """
+        cached = self.__cache.get(person_id)
+        if cached is not None and cached[0] == birthday:
+            return cached[1:]
+        day, month, year = (int(x) for x in birthday.split('-'))
+        datetime.date(year, month, day)
+        self.__cache[person_id] = (birthday, year, month, day)
+        return year, month, day
+
+    def ages_and_days(self, birthdays: list, today: datetime.datetime) -> tuple:
+        """
+        Calculate ages and days until this year birthday in one pass
+        Person born on 29 February celebrates on 1 March in non-leap years
+        :param birthdays: list of tuple(year, month, day)
+        :param today: the moment to count from
+        :return: tuple(list of ages, list of days until this year birthday (negative - already passed))
+        """
+        if not birthdays:
+            return list(), list()
+        today_key = today.month * 100 + today.day
+        has_time = today.time() != datetime.time()
+        leap_year = self.is_leap_year(today.year)
+        if np is not None:
+            return self.__numpy_ages_and_days(birthdays, today, today_key, has_time, leap_year)
+
+        ages = list()
+        days = list()
+        today_ordinal = today.toordinal()
+        for year, month, day in birthdays:
+            key = month * 100 + day
+            if (year, key) <= (today.year, today_key):
+                ages.append(today.year - year - (today_key < key))
+            else:
+                ages.append(year - today.year - (key < today_key or (key == today_key and has_time)))
+            if key == 229 and not leap_year:
+                month, day = 3, 1
+            days.append(datetime.date(today.year, month, day).toordinal() - today_ordinal)
+        return ages, days
+
+    @staticmethod
+    def __numpy_ages_and_days(birthdays: list, today: datetime.datetime, today_key: int,
+                              has_time: bool, leap_year: bool) -> tuple:
+        """
+        NumPy implementation of ages_and_days
+        :return: tuple(list of ages, list of days until this year birthday)
+        """
+        parts = np.array(birthdays, dtype=np.int64)
+        years, months, days = parts[:, 0], parts[:, 1], parts[:, 2]
+        keys = months * 100 + days
+        born = (years < today.year) | ((years == today.year) & (keys <= today_key))
+        past_ages = today.year - years - (today_key < keys)
+        future_ages = years - today.year - ((keys < today_key) | ((keys == today_key) & has_time))
+        ages = np.where(born, past_ages, future_ages)
+
+        if not leap_year:
+            leap_day = keys == 229
+            months = np.where(leap_day, 3, months)
+            days = np.where(leap_day, 1, days)
+        this_year = np.array(['%04d-%02d-%02d' % (today.year, m, d) for m, d in zip(months.tolist(), days.tolist())],
+                             dtype='datetime64[D]')
+        days_until = (this_year - np.datetime64(today.date(), 'D')).astype(np.int64)
+        return ages.tolist(), days_until.tolist()
+
+    @staticmethod
+    def is_leap_year(year: int) -> bool:
+        return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+    @staticmethod
+    def birthday_key(month: int, day: int) -> int:
+        """
+        Day of year key which does not depend on the year: {month}{day} as integer, e.g. 29 February -> 229
+        :return: birthday key
+        """
+        return month * 100 + day
+
+    @classmethod
+    def next_birthday(cls, month: int, day: int, today: datetime.date) -> datetime.date:
+        """
+        Find the nearest birthday date starting from today (inclusive)
+        Person born on 29 February celebrates on 1 March in non-leap years
+        :return: date of the nearest birthday
+        """
+        for year in (today.year, today.year + 1):
+            if month == 2 and day == 29 and not cls.is_leap_year(year):
+                celebration = datetime.date(year, 3, 1)
+            else:
+                celebration = datetime.date(year, month, day)
+            if celebration >= today:
+                return celebration
+
+    @classmethod
+    def key_ranges(cls, today: datetime.date, horizon: int) -> list:
+        """
+        Ranges of birthday keys for the birthdays in the next {horizon} days (today inclusive)
+        The window crossing the new year is split into two ranges
+        :param today: first day of the window
+        :param horizon: length of the window in days
+        :return: list of tuple(lowest key, highest key)
+        """
+        if horizon >= 365:
+            return [(101, 1231)]
+        last_day = today + datetime.timedelta(days=horizon)
+        lowest = cls.birthday_key(today.month, today.day)
+        # 29 February is celebrated on 1 March in non-leap years
+        if lowest == 301 and not cls.is_leap_year(today.year):
+            lowest = 229
+        highest = cls.birthday_key(last_day.month, last_day.day)
+        if last_day.year == today.year:
+            return [(lowest, highest)]
+        return [(lowest, 1231), (101, highest)]
+
+
+class StorageFormat:
+    """
+    Compact typed storage of the DB file (PRAGMA user_version = version):
+    phone numbers are INTEGERs, birthdays are day ordinals (datetime.date.toordinal), favourite mark is 0/1
+    Values which can not be converted (incorrect birthdays, numbers that are not 11 digits) are stored as TEXT
+    marked by text_mark, so they are never taken for the converted ones
+    Values are converted to the storage format on write and back to the display format on read
+    by the converters of the declared column types (connections need detect_types=PARSE_DECLTYPES);
+    the declared types have BLOB affinity, so SQLite stores the values as they are
+    """
+    version = 2
+    birthday_type = "BIRTHDAY_BLOB"
+    number_type = "PHONE_BLOB"
+    text_mark = "~"
+
+    @classmethod
+    def birthday_to_storage(cls, birthday):
+        """
+        :param birthday: birthday {dd-mm-yyyy} or None
+        :return: day ordinal (int), None or the marked birthday text if it is incorrect
+        """
+        if not isinstance(birthday, str):
+            return birthday
+        try:
+            day, month, year = (int(x) for x in birthday.split('-'))
+            return datetime.date(year, month, day).toordinal()
+        except ValueError:
+            return cls.text_mark + birthday
+
+    @classmethod
+    def birthday_from_storage(cls, value: bytes) -> str:
+        if not value.isdigit():
+            return cls.text_from_storage(value)
+        date = datetime.date.fromordinal(int(value))
+        return "%02d-%02d-%04d" % (date.day, date.month, date.year)
+
+    @classmethod
+    def number_to_storage(cls, number):
+        """
+        :param number: phone number of 11 digits (see FormatChecker) or None
+        :return: the number as int, None or the marked number text if it is not normalized
+        """
+        if not isinstance(number, str):
+            return number
+        if len(number) == 11 and number.isdigit():
+            return int(number)
+        return cls.text_mark + number
+
+    @classmethod
+    def number_from_storage(cls, value: bytes) -> str:
+        return "%011d" % int(value) if value.isdigit() else cls.text_from_storage(value)
+
+    @classmethod
+    def text_from_storage(cls, value: bytes) -> str:
+        """
+        :param value: the stored text
+        :return: the text without text_mark (the text of the old formats has no mark)
+        """
+        text = value.decode()
+        return text[len(cls.text_mark):] if text.startswith(cls.text_mark) else text
+
+    @staticmethod
+    def favourite_to_storage(is_favourite):
+        return None if is_favourite is None else int(bool(is_favourite))
+
+    @staticmethod
+    def number_prefix_range(prefix: str) -> tuple:
+        """
+        Range of the stored numbers starting with the prefix (the numbers stored as text are not in it)
+        :param prefix: first digits of 11 digits phone number
+        :return: tuple(lowest number, highest number)
+        """
+        if not prefix.isdigit() or len(prefix) > 11:
+            return 1, 0
+        rest = 10 ** (11 - len(prefix))
+        return int(prefix) * rest, (int(prefix) + 1) * rest - 1
+
+    @classmethod
+    def person(cls, person_info: tuple) -> tuple:
+        """
+        :param person_info: (first name, last name, birthday, is favourite)
+        :return: person_info in the storage format
+        """
+        first_name, last_name, birthday, is_favourite = person_info
+        return first_name, last_name, cls.birthday_to_storage(birthday), cls.favourite_to_storage(is_favourite)
+
+    @classmethod
+    def phone(cls, phone_info: tuple) -> tuple:
+        """
+        :param phone_info: (owner ID, number, description)
+        :return: phone_info in the storage format
+        """
+        owner, number, description = phone_info
+        return owner, cls.number_to_storage(number), description
+
+    @classmethod
+    def search_value(cls, param: str, value):
+        """
+        Convert the value of the search param (see ContactsDB._read) to the storage format
+        birthday {dd-mm%} is looked up by the birthday key (see BirthdayCalculator.birthday_key)
+        """
+        if value is None:
+            return None
+        if param == "birthday":
+            day, month = (int(x) for x in value.rstrip('%').split('-')[:2])
+            return BirthdayCalculator.birthday_key(month, day)
+        if param == "phone_number":
+            return cls.number_to_storage(value)
+        if param == "is_favourite":
+            return cls.favourite_to_storage(value)
+        return value
+
+
+sqlite3.register_converter(StorageFormat.birthday_type, StorageFormat.birthday_from_storage)
+sqlite3.register_converter(StorageFormat.number_type, StorageFormat.number_from_storage)
+
+
+class DuplicateFinder:
+    """
+    Search of near-duplicate persons without comparing every pair:
+    persons are grouped by blocking keys (normalized name, phone suffix),
+    only persons sharing a block are compared and scored;
+    in big blocks persons are sorted by name and by birthday and compared only with the nearest ones
+    """
+
+    transliteration = str.maketrans({
+        "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+        "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+        "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+        "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya"
+    })
+
+    # Soundex codes: similar sounding consonants get the same digit, vowels are dropped
+    soundex_codes = dict(
+        [(x, "1") for x in "bfpv"] + [(x, "2") for x in "cgjkqsxz"] + [(x, "3") for x in "dt"] +
+        [("l", "4")] + [(x, "5") for x in "mn"] + [("r", "6")]
+    )
+
+    def __init__(self, max_block=50):
+        """
+        :param max_block: in blocks with more persons (e.g. common names, one office number for everybody)
+        every person is compared only with the next {max_block - 1} persons ordered by name
+        and with the next ones ordered by birthday
+        """
+        self.__max_block = max_block
+        self.__names = dict()
+        self.__birthdays = dict()
+        self.__phones = dict()
+        self.__blocks = dict()
+
+    @classmethod
+    def normalize_name(cls, first_name, last_name) -> str:
+        """
+        Case, whitespace and alphabet independent form of the full name
+        :return: normalized name
+        """
+        full_name = " ".join([str(x) for x in (first_name, last_name) if x is not None])
+        full_name = full_name.casefold().translate(cls.transliteration)
+        return " ".join("".join(x for x in word if x.isalnum()) for word in full_name.split())
+
+    @classmethod
+    def soundex(cls, word: str) -> str:
+        """
+        Soundex code of the (transliterated) word: "petrov" and "petrof" -> "p361"
+        :return: first letter + 3 digits or the word itself if it has no latin letters
+        """
+        letters = [x for x in word if x in cls.soundex_codes or x in "aehiouwy"]
+        if not letters:
+            return word
+        code = letters[0]
+        previous = cls.soundex_codes.get(letters[0], "")
+        for letter in letters[1:]:
+            digit = cls.soundex_codes.get(letter, "")
+            if digit and digit != previous:
+                code += digit
+            # h and w do not separate the same codes
+            if letter not in "hw":
+                previous = digit
+        return (code + "000")[:4]
+
+    @staticmethod
+    def phone_suffix(number) -> str:
+        """
+        Last 10 digits of the phone number - the same for {8...} and {+7...} formats
+        :return: phone suffix or empty string
+        """
+        return "".join(x for x in str(number) if x.isdigit())[-10:] if number is not None else ""
+
+    def add_person(self, person_id: int, first_name, last_name, birthday):
+        # sorted words: swapped first and last names are the same
+        normalized = " ".join(sorted(self.normalize_name(first_name, last_name).split()))
+        self.__names[person_id] = normalized
+        self.__birthdays[person_id] = birthday
+        # phonetic key - names with typos and different transliterations share a block
+        self.__add_to_block("name:" + " ".join(sorted(self.soundex(x) for x in normalized.split())), person_id)
+
+    def add_phone(self, person_id: int, number):
+        suffix = self.phone_suffix(number)
+        if suffix:
+            self.__phones.setdefault(person_id, set()).add(suffix)
+            self.__add_to_block("phone:" + suffix, person_id)
+
+    def __add_to_block(self, key: str, person_id: int):
+        block = self.__blocks.setdefault(key, list())
+        if not block or block[-1] != person_id:
+            block.append(person_id)
+
+    def score(self, first_id: int, second_id: int) -> float:
+        """
+        Similarity of two persons from 0 to 1
+        Name similarity is raised by a shared phone and lowered by different birthdays
+        :return: score
+        """
+        similarity = difflib.SequenceMatcher(None, self.__names[first_id], self.__names[second_id]).ratio()
+        if self.__phones.get(first_id, set()) & self.__phones.get(second_id, set()):
+            similarity = 0.5 + 0.5 * similarity
+        first_birthday, second_birthday = self.__birthdays[first_id], self.__birthdays[second_id]
+        if first_birthday and second_birthday and first_birthday != second_birthday:
+            similarity -= 0.3
+        return max(similarity, 0.0)
+
+    def candidate_pairs(self) -> set:
+        """
+        :return: set of tuple(smaller person ID, bigger person ID) sharing at least one block
+        (sorted neighbourhood window of a big block)
+        """
+        pairs = set()
+        for block in self.__blocks.values():
+            if len(block) < 2:
+                continue
+            block = sorted(set(block))
+            if len(block) <= self.__max_block:
+                orders, window = [block], len(block)
+            else:
+                orders = [sorted(block, key=lambda x: (self.__names[x], self.__birthdays[x] or "")),
+                          sorted(block, key=lambda x: (self.__birthdays[x] or "", self.__names[x]))]
+                window = self.__max_block
+            for order in orders:
+                for index, first_id in enumerate(order):
+                    for second_id in order[index + 1:index + window]:
+                        pairs.add((min(first_id, second_id), max(first_id, second_id)))
+        return pairs
+
+    def duplicates(self, threshold: float) -> list:
+        """
+        :param threshold: minimal score of the duplicates
+        :return: list of tuple(person ID, person ID, score) sorted by score (descending)
+        """
+        scored = list()
+        for first_id, second_id in self.candidate_pairs():
+            pair_score = self.score(first_id, second_id)
+            if pair_score >= threshold:
+                scored.append((first_id, second_id, round(pair_score, 3)))
+        scored.sort(key=lambda x: (-x[2], x[0], x[1]))
+        return scored
+
+    def clusters(self, pairs: list) -> dict:
+        """
+        Join duplicate pairs into groups (union-find) from the best scored ones, the smallest ID of a group is kept
+        Groups with different birthdays are never joined (a person without a birthday would link them)
+        :param pairs: list of tuple(person ID, person ID, ...) of the added persons sorted by score (see duplicates)
+        :return: dict duplicate person ID -> kept person ID
+        """
+        parents = dict()
+        # root of the group -> birthday of the group (None - nobody has it)
+        birthdays = dict()
+
+        def find(x):
+            if x not in parents:
+                parents[x] = x
+                birthdays[x] = self.__birthdays.get(x)
+            while parents[x] != x:
+                parents[x] = parents[parents[x]]
+                x = parents[x]
+            return x
+
+        for pair in pairs:
+            first_root, second_root = find(pair[0]), find(pair[1])
+            if first_root == second_root:
+                continue
+            first_birthday, second_birthday = birthdays[first_root], birthdays[second_root]
+            if first_birthday and second_birthday and first_birthday != second_birthday:
+                continue
+            root = min(first_root, second_root)
+            parents[max(first_root, second_root)] = root
+            birthdays[root] = first_birthday or second_birthday
+        return {person_id: find(person_id) for person_id in parents if find(person_id) != person_id}
+
+
 class ContactsDB:
     """
     Low-level api for work with the Contacts Data Base
     """
 
-    def __init__(self, db_name="phones_db.sqlite", auto_save=True):
+    def __init__(self, db_name="phones_db.sqlite", auto_save=True, birthday_horizon=30,
+                 in_memory=False, flush_interval=60, journal_compact_interval=None,
+                 backup_interval=None, backup_keep=5, backup_dir=None, profile=None, pragmas=None,
+                 busy_timeout=5.0, lock_retries=5, retry_delay=0.1):
         """
         :param db_name: name of DB file
         :param auto_save: should PhoneDB save changes on destroy
-        """
+        :param birthday_horizon: how many days ahead the nearest birthdays are looked for
+        :param in_memory: load DB file to the memory and serve all reads and writes from there
+        :param flush_interval: how often (in seconds) the in-memory DB is flushed to the DB file
+        :param journal_compact_interval: how often (in seconds) the change journal is compacted
+        in the DB file by a separate connection (in-memory DB - on the next save), None - only by _compact_journal call
+        :param backup_interval: how often (in seconds) a backup snapshot is made, None - only by _backup call
+        :param backup_keep: how many newest snapshots are kept
+        :param backup_dir: directory for the snapshots (default - {DB file name}_backups near the DB file)
+        :param profile: storage profile - name of the preset from _storage_profiles (None - SQLite defaults)
+        :param pragmas: dict of PRAGMA values overriding the profile ones
+        :param busy_timeout: how long (in seconds) a statement waits for the lock of another connection
+        :param lock_retries: how many times a write is retried after the busy timeout
+        :param retry_delay: the first retry backoff (in seconds), it doubles with every retry
+        """
+        self._db_name = db_name
         self._auto_save = auto_save
+        self._birthday_horizon = birthday_horizon
+        self._birthday_calculator = BirthdayCalculator()
         self._search_params_keys = ("person_ID", "first_name", "last_name", "birthday", "is_favourite",
                                     "phone_ID", "phone_owner_ID", "phone_number", "phone_description",
                                     "age_from", "age_to", "is_nearest_birthday")
 
-        self.SQL_connection = sqlite3.connect(db_name, check_same_thread=False)
+        self._stats_cache = (None, None)
+        self._busy_timeout = busy_timeout
+        self._journal_compaction_due = False
+        self._lock_retries = lock_retries
+        self._retry_delay = retry_delay
+        self._lock_metrics = {"lock_errors": 0, "retries": 0, "failed_writes": 0, "lock_wait_seconds": 0.0}
+        self._backup_keep = backup_keep
+        self._backup_dir = backup_dir if backup_dir is not None else path.splitext(db_name)[0] + "_backups"
+        self._in_memory = in_memory
+        self._flush_lock = threading.Lock()
+        self._periodic_tasks = list()
+        if in_memory:
+            self._disk_connection = sqlite3.connect(db_name, timeout=busy_timeout, check_same_thread=False)
+            self.SQL_connection = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES,
+                                                  check_same_thread=False)
+            self._disk_connection.backup(self.SQL_connection)
+        else:
+            self.SQL_connection = sqlite3.connect(db_name, timeout=busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                                                  check_same_thread=False)
         self.SQL_coursor = self.SQL_connection.cursor()
-        self._clean_db()
 
-        if self._create_tables() == -1:
-            print("System: can not create DB")
+        storage_pragmas = dict(self._storage_profiles[profile]) if profile is not None else dict()
+        storage_pragmas.update(pragmas if pragmas is not None else dict())
+        if self._set_pragmas(storage_pragmas) == -1:
+            print("System: can not set storage profile")
             exit()
+        # read-only DB is used as it is
+        self._read_only = str(storage_pragmas.get("query_only", "OFF")).upper() in ("ON", "1", "TRUE")
+        if not self._read_only:
+            if self._convert_storage() == -1 or self._create_tables() == -1:
+                print("System: can not create DB")
+                exit()
+            self._clean_db()
+            self._sync_birthday_index()
+            # the conversion and the clean-up are not changes of the user, they are saved at once,
+            # so the session does not keep the DB file locked from the start
+            try:
+                self._retry_on_lock(self.SQL_connection.commit)
+            except sqlite3.OperationalError as e:
+                print("System: can not save the DB clean-up:", e)
+        elif self.__storage_version() < StorageFormat.version and self.__table_exists("Persons"):
+            print("System: DB file has the old storage format, convert it: python convert_storage.py", db_name)
+
+        if in_memory:
+            self._periodic_tasks.append(PeriodicTask(flush_interval, self.__flush_on_timer))
+        if journal_compact_interval is not None:
+            self._periodic_tasks.append(PeriodicTask(journal_compact_interval, self.__compact_journal_on_timer))
+        if backup_interval is not None:
+            self._periodic_tasks.append(PeriodicTask(backup_interval, self._backup))
+
+    _storage_profiles = {
+        # UI: small memory footprint, safe and fast enough commits, works on network file systems
+        "interactive": {"page_size": 4096, "cache_size": -16000, "mmap_size": 64 * 2 ** 20,
+                        "temp_store": "MEMORY", "synchronous": "NORMAL", "journal_mode": "TRUNCATE"},
+        # import of many rows: big page cache, no waiting for the disk (DB can be lost on a power failure)
+        "bulk_load": {"page_size": 8192, "cache_size": -256000, "mmap_size": 0,
+                      "temp_store": "MEMORY", "synchronous": "OFF", "journal_mode": "MEMORY"},
+        # many searches, no writes: DB file is mapped to the memory
+        "read_only_server": {"cache_size": -64000, "mmap_size": 2 ** 30, "temp_store": "MEMORY",
+                             "synchronous": "OFF", "query_only": "ON"}
+    }
+    _pragma_names = ("page_size", "cache_size", "mmap_size", "temp_store", "synchronous", "journal_mode",
+                     "query_only", "busy_timeout")
+
+    @try_except_decorator
+    def _set_pragmas(self, pragmas: dict) -> int:
+        """
+        Set storage PRAGMAs of the connection
+        page_size is applied only to a new DB file (or after VACUUM)
+        :param pragmas: dict PRAGMA name (see _pragma_names) -> value
+        :return: 1 - success, (-1) - error
+        """
+        for pragma, value in pragmas.items():
+            if pragma not in self._pragma_names or re.fullmatch(r"-?\w+", str(value)) is None:
+                raise ValueError("unsupported PRAGMA " + str(pragma) + " = " + str(value))
+            self.SQL_connection.execute("PRAGMA " + pragma + " = " + str(value))
+        return 1
 
     def __del__(self):
+        # may be called explicitly before the garbage collector does it
+        if getattr(self, "_closed", False):
+            return
+        self._closed = True
+        for task in self._periodic_tasks:
+            task.stop()
         if self._auto_save:
             self._save()
+        elif self._in_memory:
+            # unsaved changes are discarded, the saved ones may be not flushed by the timer yet
+            self.SQL_connection.rollback()
+            self._flush()
         self.SQL_connection.close()
+        if self._in_memory:
+            self._disk_connection.close()
 
     @try_except_decorator
     def _save(self) -> int:
         """
         Save changes to DB file
+        (in-memory DB is flushed to the DB file as well)
         :return 1 - success, (-1) - error
         """
-        self.SQL_connection.commit()
+        if self._journal_compaction_due and self._compact_journal() != -1:
+            self._journal_compaction_due = False
+        self._retry_on_lock(self.SQL_connection.commit)
+        if self._flush() == -1:
+            return -1
         print("System: DB saved")
         return 1
 
+    def _retry_on_lock(self, action):
+        """
+        Call the action which takes the write lock (BEGIN IMMEDIATE of a new transaction, COMMIT)
+        and retry it on transient lock errors ("database is locked", "database is busy")
+        with exponential backoff and random jitter; lock waits and retries are counted in _lock_metrics
+        :param action: function without arguments
+        :return: result of the action
+        """
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                return action()
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                self._lock_metrics["lock_errors"] += 1
+                self._lock_metrics["lock_wait_seconds"] += time.monotonic() - started
+                if attempt >= self._lock_retries:
+                    self._lock_metrics["failed_writes"] += 1
+                    raise
+                delay = random.uniform(0, self._retry_delay * 2 ** attempt)
+                attempt += 1
+                self._lock_metrics["retries"] += 1
+                self._lock_metrics["lock_wait_seconds"] += delay
+                time.sleep(delay)
+
+    @try_except_decorator
+    def _flush(self, pages=256) -> int:
+        """
+        Copy saved (committed) state of the in-memory DB to the DB file
+        by the SQLite backup API, {pages} pages per step
+        The copy is interrupted if unsaved changes appear during it
+        :param pages: number of pages copied per step
+        :return: 1 - success, 0 - nothing to flush (DB is not in memory), (-1) - error
+        """
+        if not self._in_memory:
+            return 0
+        self.__copy_to_disk(pages)
+        return 1
+
+    def __compact_journal_on_timer(self):
+        """
+        Periodic journal compaction: the DB file is compacted by a separate connection which commits at once,
+        so the connection of the user is not touched from the timer thread
+        In-memory DB is compacted on the next save (the DB file is overwritten by the flush)
+        The compaction is skipped while the DB file is locked by the unsaved changes
+        :return: None
+        """
+        if self._in_memory:
+            self._journal_compaction_due = True
+            return
+        connection = sqlite3.connect(self._db_name, timeout=self._busy_timeout)
+        try:
+            with connection:
+                self._compact_journal_by(connection)
+        except sqlite3.Error:
+            pass
+        finally:
+            connection.close()
+
+    def __flush_on_timer(self):
+        """
+        Periodic flush of the in-memory DB, skipped while there are unsaved changes
+        :return: None
+        """
+        try:
+            self.__copy_to_disk(256)
+        except sqlite3.Error:
+            pass
+
+    def __copy_to_disk(self, pages: int):
+        with self._flush_lock:
+            self.__stop_on_transaction()
+            self.SQL_connection.backup(self._disk_connection, pages=pages, progress=self.__stop_on_transaction)
+
+    def __stop_on_transaction(self, *progress_info):
+        """
+        Backup progress callback: the backup can not finish while the source has an open transaction
+        """
+        if self.SQL_connection.in_transaction:
+            raise sqlite3.OperationalError("copy is interrupted by unsaved changes")
+
+    @try_except_decorator
+    def _backup(self, pages=64, sleep=0.01) -> str:
+        """
+        Make an online backup snapshot of the saved (committed) DB state by the SQLite backup API
+        Only {pages} pages are copied per step, the DB is not locked between the steps
+        Old snapshots are rotated: only backup_keep newest ones are kept
+        :param pages: number of pages copied per step
+        :param sleep: pause between the steps (in seconds)
+        :return: snapshot file name - success, (-1) - error
+        """
+        makedirs(self._backup_dir, exist_ok=True)
+        snapshot_name = path.join(self._backup_dir, path.splitext(path.basename(self._db_name))[0] + "-" +
+                                  datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f") + ".sqlite")
+        snapshot = sqlite3.connect(snapshot_name)
+        # separate connection to the DB file reads only saved changes and does not wait for the open transaction
+        # (in-memory DB is flushed to the DB file on every save)
+        source = sqlite3.connect(self._db_name)
+        try:
+            source.backup(snapshot, pages=pages, sleep=sleep)
+        except sqlite3.Error:
+            snapshot.close()
+            remove(snapshot_name)
+            raise
+        finally:
+            source.close()
+        snapshot.close()
+
+        for old_snapshot in self._snapshots()[self._backup_keep:]:
+            remove(old_snapshot)
+        return snapshot_name
+
+    def _snapshots(self) -> list:
+        """
+        :return: list of the backup snapshot file names, the newest first
+        """
+        if not path.isdir(self._backup_dir):
+            return list()
+        prefix = path.splitext(path.basename(self._db_name))[0] + "-"
+        return sorted([path.join(self._backup_dir, x) for x in listdir(self._backup_dir)
+                       if x.startswith(prefix) and x.endswith(".sqlite")], reverse=True)
+
+    @staticmethod
+    def _verify_snapshot(snapshot_name: str) -> bool:
+        """
+        Check the snapshot file: SQLite integrity check and presence of Persons and Phones tables
+        :param snapshot_name: snapshot file name
+        :return: True - snapshot can be restored, False - it can not
+        """
+        if not path.isfile(snapshot_name):
+            return False
+        snapshot = sqlite3.connect("file:" + pathname2url(path.abspath(snapshot_name)) + "?mode=ro", uri=True)
+        try:
+            if snapshot.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+                return False
+            tables = {x[0] for x in snapshot.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            return {"Persons", "Phones"} <= tables
+        except sqlite3.DatabaseError:
+            return False
+        finally:
+            snapshot.close()
+
+    @try_except_decorator
+    def _restore(self, snapshot_name=None) -> int:
+        """
+        Replace the DB by the verified backup snapshot
+        Unsaved changes are discarded, the restored state is saved to the DB file
+        The change journal is not taken from the snapshot: the current journal is kept and the rows
+        changed by the restore are journaled after it, so replicas get the restore as usual changes
+        :param snapshot_name: snapshot file name (default - the newest snapshot)
+        :return: 1 - success, (-1) - error
+        """
+        if snapshot_name is None:
+            snapshots = self._snapshots()
+            snapshot_name = snapshots[0] if snapshots else ""
+        if not self._verify_snapshot(snapshot_name):
+            print(" *** ERROR *** : backup snapshot is damaged or does not exist")
+            return -1
+
+        self.SQL_connection.rollback()
+        journal = self.SQL_coursor.execute("SELECT * FROM Changes ORDER BY seq").fetchall()
+        last_change = self.SQL_coursor.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'Changes'").fetchone()[0]
+        old_rows = self.__all_rows()
+        snapshot = sqlite3.connect(snapshot_name)
+        try:
+            snapshot.backup(self.SQL_connection)
+        finally:
+            snapshot.close()
+        self._stats_cache = (None, None)
+        if self._convert_storage() == -1 or self._create_tables() == -1 or self._sync_birthday_index() == -1:
+            return -1
+
+        new_rows = self.__all_rows()
+        with self._atomic():
+            self.SQL_coursor.execute("DELETE FROM Changes")
+            self.SQL_coursor.executemany("INSERT INTO Changes VALUES (?, ?, ?, ?)", journal)
+            self.SQL_coursor.execute("DELETE FROM sqlite_sequence WHERE name = 'Changes'")
+            self.SQL_coursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('Changes', ?)",
+                                     (last_change,))
+            self.SQL_coursor.executemany(
+                "INSERT INTO Changes (table_name, row_id, operation) VALUES (?, ?, ?)",
+                [(table, row_id, "DELETE") for table in old_rows
+                 for row_id in sorted(old_rows[table].keys() - new_rows[table].keys())]
+                + [(table, row_id, "INSERT" if row_id not in old_rows[table] else "UPDATE") for table in new_rows
+                   for row_id, row in sorted(new_rows[table].items()) if old_rows[table].get(row_id) != row]
+            )
+        self.SQL_connection.commit()
+        if self._flush() == -1:
+            return -1
+        print("System: DB restored from", snapshot_name)
+        return 1
+
+    def __all_rows(self) -> dict:
+        """
+        :return: dict table name (Persons, Phones) -> dict row ID -> row
+        """
+        return {table: {row[0]: row for row in self.SQL_coursor.execute("SELECT * FROM " + table)}
+                for table in ("Persons", "Phones")}
+
     @try_except_decorator
     def _create_tables(self) -> int:
         """
-        Creates two tables Persons and Phone
+        Creates two tables Persons and Phone (in the storage format, see StorageFormat)
         which are related by an phone owner id (one to many)
+        + Birthdays index table (birthday key is a day of year, see BirthdayCalculator.birthday_key)
+        + Changes journal table filled by triggers on Persons and Phones
         :return None (void):
         """
         self.SQL_coursor.execute(
@@ -68,7 +959,7 @@ class ContactsDB:
             (id INTEGER PRIMARY KEY,
             first_name TEXT,
             last_name TEXT,
-            birthday TEXT,
+            birthday ''' + StorageFormat.birthday_type + ''',
             is_favourite INTEGER)
             ''')
         self.SQL_coursor.execute(
@@ -76,62 +967,419 @@ class ContactsDB:
             CREATE TABLE IF NOT EXISTS Phones 
             (id INTEGER PRIMARY KEY,
             owner INTEGER,
-            number TEXT,
+            number ''' + StorageFormat.number_type + ''',
             description TEXT,
             foreign key (owner) references Persons(id))
             '''
         )
+        # covering indexes for the name search with the projections of _read and for the join
+        self.SQL_coursor.execute(
+            '''
+            CREATE INDEX IF NOT EXISTS Persons_name ON Persons(first_name, last_name, birthday)
+            '''
+        )
+        self.SQL_coursor.execute(
+            '''
+            CREATE INDEX IF NOT EXISTS Phones_owner ON Phones(owner, number)
+            '''
+        )
+        self.SQL_coursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS Birthdays
+            (person_id INTEGER PRIMARY KEY,
+            birthday ''' + StorageFormat.birthday_type + ''',
+            birthday_key INTEGER,
+            birth_year INTEGER,
+            foreign key (person_id) references Persons(id))
+            '''
+        )
+        self.SQL_coursor.execute(
+            '''
+            CREATE INDEX IF NOT EXISTS Birthdays_key ON Birthdays(birthday_key)
+            '''
+        )
+        self.SQL_coursor.execute(
+            '''
+            CREATE TRIGGER IF NOT EXISTS Persons_delete_birthday
+            AFTER DELETE ON Persons
+            BEGIN
+                DELETE FROM Birthdays WHERE person_id = OLD.id;
+            END
+            '''
+        )
+        self.SQL_coursor.execute(
+            '''
+            CREATE TABLE IF NOT EXISTS Changes
+            (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT,
+            row_id INTEGER,
+            operation TEXT)
+            '''
+        )
+        for table in ("Persons", "Phones"):
+            for operation, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                self.SQL_coursor.execute(
+                    '''
+                    CREATE TRIGGER IF NOT EXISTS {0}_{1}_journal
+                    AFTER {1} ON {0}
+                    BEGIN
+                        INSERT INTO Changes (table_name, row_id, operation) VALUES ('{0}', {2}.id, '{1}');
+                    END
+                    '''.format(table, operation, row)
+                )
         return 1
 
+    def __storage_version(self) -> int:
+        return self.SQL_coursor.execute("PRAGMA user_version").fetchone()[0]
+
+    def __table_exists(self, table: str) -> bool:
+        return self.SQL_coursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?)", (table,)
+        ).fetchone()[0] == 1
+
+    @try_except_decorator
+    def _convert_storage(self) -> tuple:
+        """
+        Convert Persons and Phones tables of the old storage formats
+        (0 - TEXT numbers and birthdays, 1 - INTEGER affinity columns) to StorageFormat in one transaction
+        New DB file is marked with the current storage format
+        :return: tuple(number of converted persons, number of converted phones,
+        number of birthdays and phone numbers left as text because they are incorrect) - success, (-1) - error
+        """
+        if self.__storage_version() >= StorageFormat.version:
+            return 0, 0, 0
+        if not self.__table_exists("Persons"):
+            self.SQL_coursor.execute("PRAGMA user_version = " + str(StorageFormat.version))
+            return 0, 0, 0
+
+        persons, phones = self.__convert_tables()
+        incorrect = sum(isinstance(row[3], str) for row in persons) + sum(isinstance(row[2], str) for row in phones)
+        self._stats_cache = (None, None)
+        return len(persons), len(phones), incorrect
+
+    @retry_on_lock
+    def __convert_tables(self) -> tuple:
+        """
+        Move the rows of the old format tables to the new ones, see _convert_storage
+        :return: tuple(converted Persons rows, converted Phones rows)
+        """
+        # the DB may be converted by another connection while the write lock was awaited
+        if self.__storage_version() >= StorageFormat.version:
+            return list(), list()
+        last_change = self.SQL_coursor.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM Changes" if self.__table_exists("Changes") else "SELECT 0"
+        ).fetchone()[0]
+        # indexes and triggers are created again by _create_tables
+        for object_type, object_name in self.SQL_coursor.execute(
+                '''
+                SELECT type, name FROM sqlite_master
+                WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+                AND tbl_name IN ('Persons', 'Phones', 'Birthdays')
+                ''').fetchall():
+            self.SQL_coursor.execute("DROP " + object_type.upper() + " " + object_name)
+        self.SQL_coursor.execute("DROP TABLE IF EXISTS Birthdays")
+        self.SQL_coursor.execute("ALTER TABLE Persons RENAME TO Persons_text")
+        self.SQL_coursor.execute("ALTER TABLE Phones RENAME TO Phones_text")
+        if self._create_tables() == -1:
+            raise sqlite3.DatabaseError("can not create tables")
+
+        persons = [row[:1] + StorageFormat.person(row[1:]) for row in self.SQL_coursor.execute(
+            "SELECT id, first_name, last_name, birthday, is_favourite FROM Persons_text").fetchall()]
+        phones = [row[:1] + StorageFormat.phone(row[1:]) for row in self.SQL_coursor.execute(
+            "SELECT id, owner, number, description FROM Phones_text").fetchall()]
+        self.SQL_coursor.executemany("INSERT INTO Persons VALUES (?, ?, ?, ?, ?)", persons)
+        self.SQL_coursor.executemany("INSERT INTO Phones VALUES (?, ?, ?, ?)", phones)
+        self.SQL_coursor.execute("DROP TABLE Persons_text")
+        self.SQL_coursor.execute("DROP TABLE Phones_text")
+        # the conversion is not a change of the contacts
+        self.SQL_coursor.execute("DELETE FROM Changes WHERE seq > ?", (last_change,))
+        self.SQL_coursor.execute("PRAGMA user_version = " + str(StorageFormat.version))
+        return persons, phones
+
+    @try_except_decorator
+    @retry_on_lock
+    def _sync_birthday_index(self) -> int:
+        """
+        Bring Birthdays index in line with Persons table
+        (necessary for the DB files changed without ContactsDB)
+        :return: number of updated index rows - success, (-1) - error
+        """
+        changed = self.SQL_coursor.execute(
+            '''
+            SELECT Persons.id, Persons.birthday FROM Persons
+            LEFT JOIN Birthdays ON Persons.id = Birthdays.person_id
+            WHERE Persons.birthday IS NOT Birthdays.birthday
+            '''
+        ).fetchall()
+        for person_id, birthday in changed:
+            try:
+                self.__index_birthday(person_id, birthday)
+            except ValueError:
+                print("System: incorrect birthday of the person with ID", person_id)
+        self.SQL_coursor.execute(
+            '''
+            DELETE FROM Birthdays
+            WHERE person_id NOT IN (SELECT id FROM Persons)
+            '''
+        )
+        return len(changed)
+
+    def __index_birthday(self, person_id: int, birthday):
+        """
+        Insert, update or remove person's row of the Birthdays index
+        :param person_id: the person to index
+        :param birthday: birthday {dd-mm-yyyy} or None
+        :return: None
+        """
+        if birthday is None:
+            self.SQL_coursor.execute(
+                '''
+                DELETE FROM Birthdays
+                WHERE person_id = ?
+                ''', (person_id,)
+            )
+            return
+        year, month, day = self._birthday_calculator.parse(person_id, birthday)
+        self.SQL_coursor.execute(
+            '''
+            INSERT OR REPLACE INTO Birthdays
+            VALUES (?, ?, ?, ?)
+            ''', (person_id, StorageFormat.birthday_to_storage(birthday), BirthdayCalculator.birthday_key(month, day),
+                  year)
+        )
+
+    @try_except_decorator
+    def _upcoming_birthdays(self, horizon=None, today=None) -> list:
+        """
+        Find persons with a birthday in the next {horizon} days using Birthdays index
+        :param horizon: window length in days (default - birthday_horizon of the DB)
+        :param today: first day of the window (default - today), useful for reminder jobs
+        :return: list of tuple(person ID, first name, last name, birthday, days until birthday)
+        sorted by days until birthday - success, (-1) - error
+        """
+        horizon = self._birthday_horizon if horizon is None else horizon
+        today = datetime.date.today() if today is None else today
+        ranges = BirthdayCalculator.key_ranges(today, horizon)
+        sql_result = self.SQL_coursor.execute(
+            " UNION ALL ".join([
+                '''
+                SELECT Persons.id, Persons.first_name, Persons.last_name, Persons.birthday,
+                Birthdays.birthday_key
+                FROM Birthdays, Persons
+                WHERE Birthdays.person_id = Persons.id
+                AND Birthdays.birthday_key BETWEEN ? AND ?
+                '''] * len(ranges)),
+            [bound for key_range in ranges for bound in key_range]
+        ).fetchall()
+
+        upcoming = list()
+        for person_id, first_name, last_name, birthday, key in sql_result:
+            celebration = BirthdayCalculator.next_birthday(key // 100, key % 100, today)
+            days_until = (celebration - today).days
+            if days_until <= horizon:
+                upcoming.append((person_id, first_name, last_name, birthday, days_until))
+        upcoming.sort(key=lambda x: x[4])
+        return upcoming
+
     @try_except_decorator
-    def _read(self, search_params: dict):
+    def _read(self, search_params: dict, view="main"):
         """
         Read information from joined Persons and Phones tables
         :param search_params: dict where only necessary search params are
         keys: person_ID (INT), first_name (STR), last_name (STR), birthday(day/month) (STR),
         is_favourite (BOOL), phone_ID (INT), phone_owner_ID (INT), phone_number (STR), phone_description (STR),
-        age_from (INT), age_to (INT), is_nearest_birthday (BOOL)
+        age_from (INT), age_to (INT), is_nearest_birthday (BOOL),
+        first_name_prefix, last_name_prefix, phone_number_prefix, phone_description_prefix (STR) - not in "main" view
+        :param view: which columns to read - name of the view (see _views) or tuple of column names (see _columns)
+        "main" - all columns, age is added to the birthday; "exists" - only check if anything is found
 
         :return: Iterable Object of Tuples (table rows) or 0 in error case
+        (True/False for "exists" view)
         """
-        sql_search = self.__create_search_tuple(search_params)
-        sql_result = self.SQL_coursor.execute(
+        if view == "main":
+            sql_search = self._create_search_tuple(search_params)
+            sql_result = self._search_rows(sql_search)
+            return self._filter_by_birthday(sql_result, sql_search)
+
+        condition, values = self._search_condition(search_params)
+        if view == "exists":
+            return bool(self.SQL_coursor.execute(
+                '''
+                SELECT EXISTS (
+                SELECT 1 FROM Persons, Phones
+                WHERE ''' + condition + ")", values
+            ).fetchone()[0])
+        projection = self._views[view] if isinstance(view, str) else view
+        return self.SQL_coursor.execute(
             '''
+            SELECT ''' + ", ".join([self._columns[column] for column in projection]) + '''
+            FROM Persons, Phones
+            WHERE ''' + condition + '''
+            ORDER BY Persons.first_name, Persons.last_name
+            ''', values
+        ).fetchall()
+
+    _columns = {
+        "person_ID": "Persons.id",
+        "first_name": "Persons.first_name",
+        "last_name": "Persons.last_name",
+        "birthday": "Persons.birthday",
+        "is_favourite": "Persons.is_favourite",
+        "phone_ID": "Phones.id",
+        "phone_owner_ID": "Phones.owner",
+        "phone_number": "Phones.number",
+        "phone_description": "Phones.description"
+    }
+    _views = {
+        "birthday": ("first_name", "last_name", "birthday"),
+        "persons": ("person_ID", "first_name", "last_name"),
+        "phones": ("phone_ID", "phone_owner_ID", "phone_number"),
+        "export": ("person_ID", "first_name", "last_name", "birthday", "is_favourite",
+                   "phone_ID", "phone_number", "phone_description"),
+        "preview": ("person_ID", "first_name", "last_name", "birthday", "phone_number", "phone_description")
+    }
+
+    _search_query = '''
             SELECT * FROM Persons, Phones
             WHERE Persons.id = Phones.owner
             AND (? IS NULL OR Persons.id = ?)
             AND (? IS NULL OR Persons.first_name = ?)
             AND (? IS NULL OR Persons.last_name = ?)
-            AND (? IS NULL OR Persons.birthday LIKE ?)
+            AND (? IS NULL OR Persons.id IN (SELECT person_id FROM Birthdays WHERE birthday_key = ?))
             AND (? IS NULL OR Persons.is_favourite = ?)
             AND (? IS NULL OR Phones.id = ?)
             AND (? IS NULL OR Phones.owner = ?)
             AND (? IS NULL OR Phones.number = ?)
             AND (? IS NULL OR Phones.description = ?)
             ORDER BY Persons.first_name, Persons.last_name
-            ''', sql_search[:18]
+            '''
+
+    _search_conditions = {
+        "person_ID": "Persons.id = ?",
+        "first_name": "Persons.first_name = ?",
+        "last_name": "Persons.last_name = ?",
+        "birthday": "Persons.id IN (SELECT person_id FROM Birthdays WHERE birthday_key = ?)",
+        "is_favourite": "Persons.is_favourite = ?",
+        "phone_ID": "Phones.id = ?",
+        "phone_owner_ID": "Phones.owner = ?",
+        "phone_number": "Phones.number = ?",
+        "phone_description": "Phones.description = ?",
+        "first_name_prefix": "Persons.first_name GLOB ?",
+        "last_name_prefix": "Persons.last_name GLOB ?",
+        "phone_number_prefix": "(Phones.number BETWEEN ? AND ? OR Phones.number GLOB ?)",
+        "phone_description_prefix": "Phones.description GLOB ?"
+    }
+
+    @staticmethod
+    def _glob_prefix(prefix: str) -> str:
+        """
+        GLOB pattern for the strings starting with the prefix (GLOB prefix search uses indexes unlike LIKE)
+        """
+        return re.sub(r"([*?\[])", r"[\1]", prefix) + "*"
+
+    def _search_condition(self, search_params: dict, today=None) -> tuple:
+        """
+        Build WHERE condition for joined Persons and Phones tables from the search params (the same as in _read)
+        Filters by date of birthday are made by Birthdays index,
+        age is counted as the number of full years (29 February - 1 March in non-leap years)
+        :param search_params: dict where only necessary search params are, see _read
+        :param today: the day to count ages and the nearest birthdays from (default - today)
+        :return: tuple(SQL condition, list of its parameters)
+        """
+        today = datetime.date.today() if today is None else today
+        conditions = ["Persons.id = Phones.owner"]
+        values = list()
+        for param, condition in self._search_conditions.items():
+            if search_params.get(param) is not None:
+                conditions.append(condition)
+                if param == "phone_number_prefix":
+                    values.extend(StorageFormat.number_prefix_range(search_params[param]))
+                    values.append(self._glob_prefix(StorageFormat.text_mark + search_params[param]))
+                elif param.endswith("_prefix"):
+                    values.append(self._glob_prefix(search_params[param]))
+                else:
+                    values.append(StorageFormat.search_value(param, search_params[param]))
+        if search_params.get("age_from") is not None and search_params.get("age_to") is not None:
+            conditions.append(
+                '''Persons.id IN (
+                SELECT person_id FROM Birthdays
+                WHERE ? - birth_year - (? < birthday_key) BETWEEN ? AND ?
+                )''')
+            values.extend([today.year, BirthdayCalculator.birthday_key(today.month, today.day),
+                           search_params["age_from"], search_params["age_to"]])
+        if search_params.get("is_nearest_birthday"):
+            ranges = BirthdayCalculator.key_ranges(today, self._birthday_horizon)
+            conditions.append(
+                '''Persons.id IN (
+                SELECT person_id FROM Birthdays
+                WHERE ''' + " OR ".join(["birthday_key BETWEEN ? AND ?"] * len(ranges)) + ")")
+            values.extend([bound for key_range in ranges for bound in key_range])
+        return "\n            AND ".join(conditions), values
+
+    def _read_page(self, search_params: dict, page=0, page_size=10, view="preview") -> list:
+        """
+        Read one page of the found rows (see _read, view can not be "main" or "exists")
+        A new cursor is used for every call, so pages can be read in the other thread (see LiveSearch)
+        :param search_params: dict where only necessary search params are, see _read
+        :param page: page number starting from 0
+        :param page_size: rows per page
+        :param view: name of the view (see _views) or tuple of column names (see _columns)
+        :return: list of rows
+        """
+        condition, values = self._search_condition(search_params)
+        projection = self._views[view] if isinstance(view, str) else view
+        return self.SQL_connection.execute(
+            '''
+            SELECT ''' + ", ".join([self._columns[column] for column in projection]) + '''
+            FROM Persons, Phones
+            WHERE ''' + condition + '''
+            ORDER BY Persons.first_name, Persons.last_name, Phones.id
+            LIMIT ? OFFSET ?
+            ''', values + [page_size, page * page_size]
         ).fetchall()
 
+    def _search_rows(self, sql_search: tuple) -> list:
+        """
+        Run the search query (everything except the filters by date of birthday)
+        :param sql_search: search tuple, see _create_search_tuple
+        :return: list of joined Persons and Phones rows ordered by first and last name
+        """
+        return self.SQL_coursor.execute(self._search_query, sql_search[:18]).fetchall()
+
+    def _filter_by_birthday(self, sql_result: list, sql_search: tuple) -> list:
+        """
+        Filter rows by the age and the nearest birthday, add age value to the birthday column
+        :param sql_result: rows of the search query
+        :param sql_search: search tuple, see _create_search_tuple
+        :return: list of filtered rows
+        """
         # filter by date of birthday
         today = datetime.datetime.now()
+        upcoming_ids = {x[0] for x in self._upcoming_birthdays(None, today.date())} if sql_search[20] else set()
+        birthdays = dict()
+        for index, record in enumerate(sql_result):
+            if record[3] is not None:
+                try:
+                    birthdays[index] = self._birthday_calculator.parse(record[0], record[3])
+                except ValueError:
+                    pass
+        ages = dict(zip(birthdays, self._birthday_calculator.ages_and_days(list(birthdays.values()), today)[0]))
+
         filtered_data = list()
-        for record in sql_result:
-            if record[3] is None:
+        for index, record in enumerate(sql_result):
+            # no birthday or an incorrect one (left as text by the storage conversion) - shown without age
+            if index not in ages:
                 if sql_search[18] is None and sql_search[20] is None:
                     filtered_data.append(record)
                 continue
-            record_birthday = datetime.datetime.strptime(record[3] + " 00:00:00", '%d-%m-%Y %H:%M:%S')
-            this_year_birthday = datetime.datetime.strptime(record[3][:-4] +
-                                                            str(today.year) + " 00:00:00", '%d-%m-%Y %H:%M:%S')
-            difference_in_years = abs(relativedelta(record_birthday, today).years)
-            difference_in_days = this_year_birthday - today
+            difference_in_years = ages[index]
             # by the age
             if sql_search[18] is not None and sql_search[19] is not None \
                     and not (sql_search[18] <= difference_in_years <= sql_search[19]):
                 continue
 
             # by the nearest birthday
-            if sql_search[20] and (difference_in_days.days > 30 or difference_in_days.days < 0):
+            if sql_search[20] and record[0] not in upcoming_ids:
                 continue
 
             # add age value
@@ -141,7 +1389,7 @@ class ContactsDB:
         return filtered_data
 
     @try_except_decorator
-    def __create_search_tuple(self, search_params: dict) -> tuple:
+    def _create_search_tuple(self, search_params: dict) -> tuple:
         """
         Create tuple with fixed length from the dict of search parameters
         :param search_params: dict where only necessary search params are
@@ -149,7 +1397,7 @@ class ContactsDB:
         """
         new_search_list = list()
         for param in self._search_params_keys:
-            element = search_params[param] if param in search_params.keys() else None
+            element = StorageFormat.search_value(param, search_params.get(param))
             new_search_list.append(element)
             # need double values because there are 2 '?' in SQL search condition
             if self._search_params_keys.index(param) < 9:
@@ -165,53 +1413,68 @@ class ContactsDB:
         :return: 1 - name exists, 0 - name doesn't exist, (-1) - error
         """
 
-        return len(self._read({'first_name': first_name, 'last_name': last_name})) > 0
+        return self._read({'first_name': first_name, 'last_name': last_name}, "exists")
 
     @try_except_decorator
-    def _insert_record(self, person_info: tuple, phone_info: tuple):
+    @retry_on_lock
+    def _insert_record(self, person_info: tuple, phone_info: tuple, person_id=None, phone_id=None):
         """
         Create a new record about the person and his/her first contact
         :param person_info: person_info - a row of data for Persons table EXCEPT person_ID
         :param phone_info: phone_info - a row of data for Phones table EXCEPT phone_ID and owner_ID
+        :param person_id: ID for the new person (default - next after the maximum one)
+        :param phone_id: ID for the new phone (default - next after the maximum one)
         :return: tuple(new person id, new phone id) - success, (-1) - error
         """
-        new_person_id = self.__insert_person(person_info)
+        new_person_id = self.__insert_person(person_info, person_id)
+        if new_person_id == -1:
+            raise sqlite3.DatabaseError("can not insert the person")
         new_phone_info = tuple([new_person_id] + list(phone_info[:]))
-        new_phone_id = self._insert_phone(new_phone_info)
+        new_phone_id = self._insert_phone(new_phone_info, phone_id)
+        if new_phone_id == -1:
+            raise sqlite3.DatabaseError("can not insert the phone")
         return new_person_id, new_phone_id
 
     @try_except_decorator
-    def __insert_person(self, person_info: tuple) -> int:
+    @retry_on_lock
+    def __insert_person(self, person_info: tuple, person_id=None) -> int:
         """
         Insert person information to the DB
         Private method to except the case of adding a person without a phone number
         :param person_info - a row of data for Persons table EXCEPT id
+        :param person_id - ID for the new person (default - next after the maximum one)
         :return: inserted person ID - success, (-1) - error
         """
-        self.SQL_coursor.execute(
-            '''
-            INSERT INTO Persons
-            VALUES ((SELECT MAX(id) from Persons) + 1, ?, ?, ?, ?)
-            ''', person_info
-        )
-        return self.__persons_max_index()
+        with self._atomic():
+            self.SQL_coursor.execute(
+                '''
+                INSERT INTO Persons
+                VALUES (COALESCE(?, (SELECT MAX(id) from Persons) + 1), ?, ?, ?, ?)
+                ''', (person_id,) + StorageFormat.person(tuple(person_info))
+            )
+            new_person_id = self.SQL_coursor.lastrowid if person_id is None else person_id
+            self.__index_birthday(new_person_id, person_info[2])
+        return new_person_id
 
     @try_except_decorator
-    def _insert_phone(self, phone_info: tuple) -> int:
+    @retry_on_lock
+    def _insert_phone(self, phone_info: tuple, phone_id=None) -> int:
         """
         Insert phone information to the DB
         :param phone_info - a row of data for Phones table EXCEPT id
+        :param phone_id - ID for the new phone (default - next after the maximum one)
         :return: inserted phone ID - success, (-1) - error
         """
         self.SQL_coursor.execute(
             '''
             INSERT INTO Phones
-            VALUES ((SELECT MAX(id) from Phones) + 1, ?, ?, ?)
-            ''', phone_info
+            VALUES (COALESCE(?, (SELECT MAX(id) from Phones) + 1), ?, ?, ?)
+            ''', (phone_id,) + StorageFormat.phone(tuple(phone_info))
         )
-        return self.__phones_max_index()
+        return self.__phones_max_index() if phone_id is None else phone_id
 
     @try_except_decorator
+    @retry_on_lock
     def _update_person(self, person_info: tuple) -> int:
         """
         Update person information to the DB
@@ -240,20 +1503,23 @@ class ContactsDB:
                 UPDATE Persons
                 SET birthday = ?
                 WHERE Persons.id = ?
-                ''', (person_info[3], person_info[0])
+                ''', (StorageFormat.birthday_to_storage(person_info[3]), person_info[0])
             )
+            self.__index_birthday(person_info[0], person_info[3])
         if person_info[4] is not None:
             self.SQL_coursor.execute(
                 '''
                 UPDATE Persons
                 SET is_favourite = ?
                 WHERE Persons.id = ?
-                ''', (person_info[4], person_info[0])
+                ''', (StorageFormat.favourite_to_storage(person_info[4]), person_info[0])
             )
-        self._clean_db()
+        if self._clean_db() == -1:
+            raise sqlite3.DatabaseError("can not delete persons without phones")
         return 1
 
     @try_except_decorator
+    @retry_on_lock
     def _update_phone(self, phone_info: tuple) -> int:
         """
         Update phone information to the DB
@@ -274,7 +1540,7 @@ class ContactsDB:
                 UPDATE Phones
                 SET number = ?
                 WHERE id = ?
-                ''', (phone_info[2], phone_info[0])
+                ''', (StorageFormat.number_to_storage(phone_info[2]), phone_info[0])
             )
         if phone_info[3] is not None:
             self.SQL_coursor.execute(
@@ -284,133 +1550,1071 @@ class ContactsDB:
                 WHERE id = ?
                 ''', (phone_info[3], phone_info[0])
             )
-        self._clean_db()
+        if self._clean_db() == -1:
+            raise sqlite3.DatabaseError("can not delete persons without phones")
+        return 1
+
+    @try_except_decorator
+    @retry_on_lock
+    def _delete_person(self, person_id) -> int:
+        """
+        Delete the person information by the column and its value
+        + delete all phones of this person
+        :param person_id: the person to delete
+        :return: 1 - success, (-1) - error
+        """
+        self.SQL_coursor.execute(
+            '''
+            DELETE FROM Persons
+            WHERE id = ?;
+            
+            ''', (person_id,)
+        )
+        self.SQL_coursor.execute(
+            '''
+            DELETE FROM Phones
+            WHERE owner = ?
+            ''', (person_id,)
+        )
+        return 1
+
+    @try_except_decorator
+    @retry_on_lock
+    def _delete_phone(self, phone_id) -> int:
+        """
+        Delete the phone information by the column and its value
+
+        :param phone_id: the phone to delete
+        :return: 1 - success, (-1) - error
+        """
+        self.SQL_coursor.execute(
+            '''
+            DELETE FROM Phones
+            WHERE id = ?
+            ''', (phone_id,)
+        )
+
+        # if we deleted the only one phone number of a person we should delete a person too
+        if self._clean_db() == -1:
+            raise sqlite3.DatabaseError("can not delete persons without phones")
+        return 1
+
+    @try_except_decorator
+    @retry_on_lock
+    def _clean_db(self) -> int:
+        """
+        Delete persons without phone numbers from the table
+        :return: 1 - success, (-1) - error
+        """
+        self.SQL_coursor.execute(
+            '''
+            DELETE FROM Persons
+            WHERE Persons.id NOT IN (
+            SELECT Persons.id FROM Persons, Phones
+            WHERE Persons.id = Phones.owner
+            )
+
+            ''')
+        return 1
+
+    @contextmanager
+    def _atomic(self):
+        """
+        Apply all changes made inside the block or none of them (SAVEPOINT)
+        The changes stay unsaved until _save as usual; a new transaction takes the write lock at once
+        (BEGIN IMMEDIATE) and is rolled back if the block fails
+        """
+        begun = not self.SQL_connection.in_transaction
+        if begun:
+            self.SQL_coursor.execute("BEGIN IMMEDIATE")
+        self.SQL_coursor.execute("SAVEPOINT atomic")
+        try:
+            yield
+        except BaseException:
+            self.SQL_coursor.execute("ROLLBACK TO atomic")
+            self.SQL_coursor.execute("RELEASE atomic")
+            if begun:
+                self.SQL_connection.rollback()
+            raise
+        self.SQL_coursor.execute("RELEASE atomic")
+
+    @try_except_decorator
+    def _find_duplicates(self, threshold=0.85, max_block=50) -> list:
+        """
+        Find near-duplicate persons (case, whitespace, transliteration, shared phone numbers)
+        :param threshold: minimal similarity score (0..1) of the duplicates
+        :param max_block: maximal number of persons sharing one blocking key to compare each with each
+        :return: list of tuple(person ID, person ID, score) - success, (-1) - error
+        """
+        return self.__duplicate_finder(max_block).duplicates(threshold)
+
+    def __duplicate_finder(self, max_block: int) -> DuplicateFinder:
+        """
+        :return: DuplicateFinder with all persons and phones of the DB
+        """
+        finder = DuplicateFinder(max_block)
+        for person_id, first_name, last_name, birthday in self.SQL_connection.execute(
+                "SELECT id, first_name, last_name, birthday FROM Persons"):
+            finder.add_person(person_id, first_name, last_name, birthday)
+        for owner, number in self.SQL_connection.execute("SELECT owner, number FROM Phones"):
+            finder.add_phone(owner, number)
+        return finder
+
+    @try_except_decorator
+    @retry_on_lock
+    def _merge_persons(self, merges: dict) -> tuple:
+        """
+        Merge persons in one transaction: phones of duplicates are moved to the kept persons,
+        the same phone numbers of a person are left once, empty birthday and favourite mark
+        are taken from duplicates, duplicates are deleted
+        :param merges: dict duplicate person ID -> kept person ID
+        :return: tuple(number of merged persons, number of moved phones) - success, (-1) - error
+        """
+        if set(merges) & set(merges.values()):
+            raise ValueError("kept persons can not be duplicates: " + str(sorted(set(merges) & set(merges.values()))))
+        with self._atomic():
+            self.SQL_coursor.execute(
+                '''
+                CREATE TEMP TABLE IF NOT EXISTS Merges
+                (duplicate_id INTEGER PRIMARY KEY,
+                keep_id INTEGER)
+                '''
+            )
+            self.SQL_coursor.execute("DELETE FROM temp.Merges")
+            self.SQL_coursor.executemany("INSERT INTO temp.Merges VALUES (?, ?)", merges.items())
+            moved_phones = self.SQL_coursor.execute(
+                '''
+                UPDATE Phones
+                SET owner = (SELECT keep_id FROM temp.Merges WHERE duplicate_id = Phones.owner)
+                WHERE owner IN (SELECT duplicate_id FROM temp.Merges)
+                '''
+            ).rowcount
+            self.SQL_coursor.execute(
+                '''
+                DELETE FROM Phones
+                WHERE owner IN (SELECT keep_id FROM temp.Merges)
+                AND id NOT IN (
+                SELECT MIN(id) FROM Phones
+                WHERE owner IN (SELECT keep_id FROM temp.Merges)
+                GROUP BY owner, number
+                )
+                '''
+            )
+            self.SQL_coursor.execute(
+                '''
+                UPDATE Persons
+                SET birthday = COALESCE(birthday, (
+                SELECT Duplicates.birthday FROM Persons AS Duplicates, temp.Merges
+                WHERE Duplicates.id = Merges.duplicate_id AND Merges.keep_id = Persons.id
+                AND Duplicates.birthday IS NOT NULL
+                )),
+                is_favourite = (
+                SELECT MAX(Duplicates.is_favourite) FROM Persons AS Duplicates
+                WHERE Duplicates.id = Persons.id
+                OR Duplicates.id IN (SELECT duplicate_id FROM temp.Merges WHERE keep_id = Persons.id)
+                )
+                WHERE id IN (SELECT keep_id FROM temp.Merges)
+                '''
+            )
+            merged_persons = self.SQL_coursor.execute(
+                '''
+                DELETE FROM Persons
+                WHERE id IN (SELECT duplicate_id FROM temp.Merges)
+                '''
+            ).rowcount
+            if self._sync_birthday_index() == -1:
+                raise sqlite3.DatabaseError("can not update Birthdays index")
+        return merged_persons, moved_phones
+
+    @try_except_decorator
+    def _merge_duplicates(self, threshold=0.85, max_block=50) -> tuple:
+        """
+        Find near-duplicate persons and merge every group of them into the person with the smallest ID
+        (persons with different birthdays are not merged into one group)
+        :param threshold: minimal similarity score (0..1) of the duplicates
+        :param max_block: maximal number of persons sharing one blocking key to compare each with each
+        :return: tuple(number of merged persons, number of moved phones) - success, (-1) - error
+        """
+        finder = self.__duplicate_finder(max_block)
+        return self._merge_persons(finder.clusters(finder.duplicates(threshold)))
+
+    @try_except_decorator
+    def _bulk_delete_counts(self, search_params: dict) -> tuple:
+        """
+        Count what the bulk deletes would delete (to confirm them before)
+        :param search_params: dict where only necessary search params are, see _read
+        :return: tuple(number of found persons, number of all their phones,
+        number of found phones, number of persons left without phones after their delete) - success, (-1) - error
+        """
+        condition, values = self._search_condition(search_params)
+        return self.SQL_connection.execute(
+            '''
+            WITH FoundPersons AS (SELECT DISTINCT Persons.id FROM Persons, Phones WHERE ''' + condition + '''),
+            FoundPhones AS (SELECT DISTINCT Phones.id FROM Persons, Phones WHERE ''' + condition + ''')
+            SELECT (SELECT COUNT(*) FROM FoundPersons),
+            (SELECT COUNT(*) FROM Phones WHERE owner IN FoundPersons),
+            (SELECT COUNT(*) FROM FoundPhones),
+            (SELECT COUNT(*) FROM Persons WHERE id NOT IN (
+            SELECT owner FROM Phones WHERE id NOT IN FoundPhones AND owner IS NOT NULL))
+            ''', values + values
+        ).fetchone()
+
+    @try_except_decorator
+    @retry_on_lock
+    def _bulk_delete_persons(self, search_params: dict) -> tuple:
+        """
+        Delete all found persons with all their phones in one transaction
+        :param search_params: dict where only necessary search params are, see _read
+        :return: tuple(number of deleted persons, number of deleted phones) - success, (-1) - error
+        """
+        condition, values = self._search_condition(search_params)
+        with self._atomic():
+            self.SQL_coursor.execute("CREATE TEMP TABLE IF NOT EXISTS BulkPersons (id INTEGER PRIMARY KEY)")
+            self.SQL_coursor.execute("DELETE FROM temp.BulkPersons")
+            self.SQL_coursor.execute(
+                '''
+                INSERT INTO temp.BulkPersons
+                SELECT DISTINCT Persons.id FROM Persons, Phones
+                WHERE ''' + condition, values
+            )
+            deleted_phones = self.SQL_coursor.execute(
+                '''
+                DELETE FROM Phones
+                WHERE owner IN (SELECT id FROM temp.BulkPersons)
+                '''
+            ).rowcount
+            deleted_persons = self.SQL_coursor.execute(
+                '''
+                DELETE FROM Persons
+                WHERE id IN (SELECT id FROM temp.BulkPersons)
+                '''
+            ).rowcount
+        return deleted_persons, deleted_phones
+
+    @try_except_decorator
+    @retry_on_lock
+    def _bulk_delete_phones(self, search_params: dict) -> tuple:
+        """
+        Delete all found phones in one transaction,
+        persons left without phones are deleted too
+        :param search_params: dict where only necessary search params are, see _read
+        :return: tuple(number of deleted phones, number of deleted persons) - success, (-1) - error
+        """
+        condition, values = self._search_condition(search_params)
+        with self._atomic():
+            deleted_phones = self.SQL_coursor.execute(
+                '''
+                DELETE FROM Phones
+                WHERE id IN (
+                SELECT Phones.id FROM Persons, Phones
+                WHERE ''' + condition + ")", values
+            ).rowcount
+            deleted_persons = self.__delete_persons_without_phones()
+        return deleted_phones, deleted_persons
+
+    @try_except_decorator
+    @retry_on_lock
+    def _bulk_transfer_phones(self, search_params: dict, new_owner_id: int) -> tuple:
+        """
+        Change the owner of all found phones in one transaction,
+        persons left without phones are deleted
+        :param search_params: dict where only necessary search params are, see _read
+        :param new_owner_id: ID of the new owner
+        :return: tuple(number of transferred phones, number of deleted persons) - success, (-1) - error
+        """
+        condition, values = self._search_condition(search_params)
+        with self._atomic():
+            if self.SQL_coursor.execute("SELECT 1 FROM Persons WHERE id = ?", (new_owner_id,)).fetchone() is None:
+                raise ValueError("such Person does not exist")
+            transferred_phones = self.SQL_coursor.execute(
+                '''
+                UPDATE Phones
+                SET owner = ?
+                WHERE id IN (
+                SELECT Phones.id FROM Persons, Phones
+                WHERE ''' + condition + ")", [new_owner_id] + values
+            ).rowcount
+            deleted_persons = self.__delete_persons_without_phones()
+        return transferred_phones, deleted_persons
+
+    def __delete_persons_without_phones(self) -> int:
+        """
+        The same as _clean_db but raises errors
+        :return: number of deleted persons
+        """
+        return self.SQL_coursor.execute(
+            '''
+            DELETE FROM Persons
+            WHERE id NOT IN (SELECT owner FROM Phones WHERE owner IS NOT NULL)
+            '''
+        ).rowcount
+
+    @try_except_decorator
+    def _last_change(self) -> int:
+        """
+        :return: sequence number of the last change (0 - no changes) - success, (-1) - error
+        """
+        return self.SQL_coursor.execute("SELECT COALESCE(MAX(seq), 0) FROM Changes").fetchone()[0]
+
+    @try_except_decorator
+    def _changes_since(self, seq: int, limit=1000) -> list:
+        """
+        Read the change journal for incremental sync and export
+        A replica applies every change as an upsert of the returned row or as a delete if the row is None
+        and remembers the sequence number of the last applied change
+        :param seq: sequence number of the last change the replica has
+        :param limit: maximal number of changes to return
+        :return: list of tuple(seq, table name, row ID, operation, current row or None) ordered by seq
+        - success, (-1) - error
+        """
+        changes = self.SQL_coursor.execute(
+            '''
+            SELECT seq, table_name, row_id, operation FROM Changes
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+            ''', (seq, limit)
+        ).fetchall()
+        if not changes:
+            return list()
+
+        rows = dict()
+        for table in ("Persons", "Phones"):
+            for row in self.SQL_coursor.execute(
+                    '''
+                    SELECT * FROM {0}
+                    WHERE id IN (
+                    SELECT row_id FROM Changes
+                    WHERE seq > ? AND seq <= ? AND table_name = '{0}'
+                    )
+                    '''.format(table), (seq, changes[-1][0])):
+                rows[(table, row[0])] = row
+        return [change + (rows.get((change[1], change[2])),) for change in changes]
+
+    @try_except_decorator
+    @retry_on_lock
+    def _compact_journal(self, confirmed_seq=None) -> int:
+        """
+        Leave only the last change of every row in the journal,
+        deletes confirmed by all replicas are removed too
+        :param confirmed_seq: sequence number all replicas have already applied (None - unknown)
+        :return: number of removed journal rows - success, (-1) - error
+        """
+        return self._compact_journal_by(self.SQL_connection, confirmed_seq)
+
+    @staticmethod
+    def _compact_journal_by(connection, confirmed_seq=None) -> int:
+        """
+        Compact the journal by the connection (see _compact_journal)
+        :return: number of removed journal rows
+        """
+        removed = connection.execute(
+            '''
+            DELETE FROM Changes
+            WHERE seq NOT IN (SELECT MAX(seq) FROM Changes GROUP BY table_name, row_id)
+            '''
+        ).rowcount
+        if confirmed_seq is not None:
+            removed += connection.execute(
+                '''
+                DELETE FROM Changes
+                WHERE operation = 'DELETE' AND seq <= ?
+                ''', (confirmed_seq,)
+            ).rowcount
+        return removed
+
+    @try_except_decorator
+    def _stats(self) -> dict:
+        """
+        DB statistics computed by SQL
+        The result is cached until the DB is changed (by this connection or committed by another one)
+        :return: dict with keys: persons, phones, favourites,
+        phones_per_person (dict number of phones -> number of persons),
+        birthdays_per_month (dict month -> number of persons),
+        age_buckets (dict first age of the decade -> number of persons) - success, (-1) - error
+        """
+        today = datetime.date.today()
+        data_version = self.SQL_connection.execute("PRAGMA data_version").fetchone()[0]
+        cache_key = (self.SQL_connection.total_changes, data_version, today)
+        if self._stats_cache[0] == cache_key:
+            return self._stats_cache[1]
+
+        stats = dict()
+        stats["persons"] = self.__persons_length()
+        stats["phones"] = self.__phones_length()
+        stats["favourites"] = self.SQL_connection.execute(
+            '''
+            SELECT COUNT(id) FROM Persons
+            WHERE is_favourite
+            '''
+        ).fetchone()[0]
+        stats["phones_per_person"] = dict(self.SQL_connection.execute(
+            '''
+            SELECT phones, COUNT(*) FROM (
+            SELECT COUNT(id) AS phones FROM Phones
+            GROUP BY owner
+            )
+            GROUP BY phones
+            ORDER BY phones
+            '''
+        ).fetchall())
+        stats["birthdays_per_month"] = dict(self.SQL_connection.execute(
+            '''
+            SELECT birthday_key / 100 AS month, COUNT(*) FROM Birthdays
+            GROUP BY month
+            ORDER BY month
+            '''
+        ).fetchall())
+        stats["age_buckets"] = dict(self.SQL_connection.execute(
+            '''
+            SELECT age / 10 * 10 AS bucket, COUNT(*) FROM (
+            SELECT ? - birth_year - (? < birthday_key) AS age FROM Birthdays
+            )
+            GROUP BY bucket
+            ORDER BY bucket
+            ''', (today.year, BirthdayCalculator.birthday_key(today.month, today.day))
+        ).fetchall())
+        self._stats_cache = (cache_key, stats)
+        return stats
+
+    def _metrics(self) -> dict:
+        """
+        Lock metrics of the write methods
+        :return: dict with keys: lock_errors, retries, failed_writes, lock_wait_seconds
+        """
+        return dict(self._lock_metrics)
+
+    @try_except_decorator
+    def __persons_length(self) -> int:
+        """
+        function to calculate the length of Persons table
+        :return: number of rows in the table
+        """
+        self.SQL_coursor.execute(
+            '''
+            SELECT COUNT(id) from Persons
+            '''
+        )
+        return int(self.SQL_coursor.fetchone()[0])
+
+    @try_except_decorator
+    def __phones_length(self) -> int:
+        """
+        function to calculate the length of Phones table
+        :return: number of rows in the table
+        """
+        self.SQL_coursor.execute(
+            '''
+            SELECT COUNT(id) from Phones
+            '''
+        )
+        return int(self.SQL_coursor.fetchone()[0])
+
+    @try_except_decorator
+    def __persons_max_index(self) -> int:
+        """
+        function to calculate new index for Persons table
+        :return: new index
+        """
+        self.SQL_coursor.execute(
+            '''
+            SELECT MAX(id) from Persons
+            '''
+        )
+        return int(self.SQL_coursor.fetchone()[0])
+
+    @try_except_decorator
+    def __phones_max_index(self) -> int:
+        """
+        function to calculate new index for Phones table
+        :return: new index
+        """
+        self.SQL_coursor.execute(
+            '''
+            SELECT MAX(id) from Phones
+            '''
+        )
+        return int(self.SQL_coursor.fetchone()[0])
+
+    def _read_all_persons(self):
+        return self.SQL_coursor.execute(
+            '''
+            SELECT * FROM Persons
+            '''
+        )
+
+    def _read_all_phones(self):
+        return self.SQL_coursor.execute(
+            '''
+            SELECT * FROM Phones
+            '''
+        )
+
+
+def read_shard(shard_name: str, sql_search: tuple) -> list:
+    """
+    Process pool worker: run the search query on one shard file opened read-only
+    :param shard_name: shard DB file
+    :param sql_search: search tuple, see ContactsDB._create_search_tuple
+    :return: list of joined Persons and Phones rows ordered by first and last name
+    """
+    connection = sqlite3.connect("file:" + pathname2url(path.abspath(shard_name)) + "?mode=ro", uri=True,
+                                 detect_types=sqlite3.PARSE_DECLTYPES)
+    try:
+        return connection.execute(ContactsDB._search_query, sql_search[:18]).fetchall()
+    finally:
+        connection.close()
+
+
+class ShardedContactsDB:
+    """
+    Contacts Data Base partitioned across several SQLite files (shards) by the person ID hash
+    Each person is stored together with all his/her phones in one shard (ContactsDB),
+    IDs are unique across the shards. Searches fan out across the shards in a process pool.
+    Supported api (the other ContactsDB methods are not available): _save, _read (with views), _read_page,
+    _is_name_exist, _upcoming_birthdays, _insert_record, _insert_phone,
+    _update_person, _update_phone, _delete_person, _delete_phone, _clean_db
+    """
+
+    def __init__(self, db_name="phones_db.sqlite", shards=4, auto_save=True, birthday_horizon=30, workers=None,
+                 profile=None, pragmas=None):
+        """
+        :param db_name: name of DB file, shards are stored as {name}.shard{index}{extension}
+        :param shards: number of shards
+        :param auto_save: should PhoneDB save changes on destroy
+        :param birthday_horizon: how many days ahead the nearest birthdays are looked for
+        :param workers: number of search processes (default - number of processors)
+        :param profile: storage profile of the shards, see ContactsDB
+        :param pragmas: dict of PRAGMA values overriding the profile ones
+        """
+        self._db_name = db_name
+        self._auto_save = auto_save
+
+        root, extension = path.splitext(db_name)
+        self._shard_names = [root + ".shard" + str(index) + extension for index in range(shards)]
+        self._shards = [ContactsDB(shard_name, auto_save=False, birthday_horizon=birthday_horizon,
+                                   profile=profile, pragmas=pragmas)
+                        for shard_name in self._shard_names]
+
+        self.__ids_lock = threading.Lock()
+        self.__next_ids = dict()
+        for table in ("Persons", "Phones"):
+            max_ids = [shard.SQL_coursor.execute("SELECT MAX(id) FROM " + table).fetchone()[0]
+                       for shard in self._shards]
+            self.__next_ids[table] = max([x for x in max_ids if x is not None], default=0) + 1
+
+        self.__pool = ProcessPoolExecutor(max_workers=workers)
+
+    def __del__(self):
+        if self._auto_save:
+            self._save()
+        self.__pool.shutdown(wait=False)
+
+    def _shard_of(self, person_id: int) -> ContactsDB:
+        """
+        Find the shard of the person
+        :param person_id: person ID
+        :return: the shard (ContactsDB)
+        """
+        return self._shards[(int(person_id) * 2654435761) % 2 ** 32 % len(self._shards)]
+
+    def __phone_shard(self, phone_id: int):
+        """
+        Find the shard of the phone
+        :param phone_id: phone ID
+        :return: the shard (ContactsDB) or None if there is no such phone
+        """
+        for shard in self._shards:
+            if shard.SQL_coursor.execute("SELECT 1 FROM Phones WHERE id = ?", (phone_id,)).fetchone():
+                return shard
+        return None
+
+    def __new_id(self, table: str) -> int:
+        with self.__ids_lock:
+            new_id = self.__next_ids[table]
+            self.__next_ids[table] += 1
+        return new_id
+
+    @try_except_decorator
+    def _save(self) -> int:
+        """
+        Save changes of all shards
+        :return 1 - success, (-1) - error
+        """
+        for shard in self._shards:
+            shard._retry_on_lock(shard.SQL_connection.commit)
+        print("System: DB saved")
+        return 1
+
+    def __search_shards(self, sql_search: tuple) -> dict:
+        """
+        Fan out the search query across the shards
+        Shards with unsaved changes are read in this process by their own connection
+        :param sql_search: search tuple, see ContactsDB._create_search_tuple
+        :return: dict shard -> list of its joined Persons and Phones rows ordered by first and last name
+        """
+        person_id = sql_search[0] if sql_search[0] is not None else sql_search[12]
+        indexes = range(len(self._shards))
+        if person_id is not None:
+            indexes = [self._shards.index(self._shard_of(person_id))]
+
+        futures = dict()
+        for index in indexes:
+            if not self._shards[index].SQL_connection.in_transaction:
+                futures[index] = self.__pool.submit(read_shard, self._shard_names[index], sql_search)
+        return {self._shards[index]: futures[index].result() if index in futures
+                else self._shards[index]._search_rows(sql_search) for index in indexes}
+
+    @try_except_decorator
+    def _read(self, search_params: dict, view="main"):
+        """
+        Read information from all shards, see ContactsDB._read
+        Projections with first and last names are merged in first and last name order
+        """
+        if view == "main":
+            sql_search = self._shards[0]._create_search_tuple(search_params)
+            if sql_search == -1:
+                return -1
+            # rows are filtered by birthdays in their shards (the nearest birthdays are looked for there)
+            results = [shard._filter_by_birthday(rows, sql_search)
+                       for shard, rows in self.__search_shards(sql_search).items()]
+            return list(heapq.merge(*results, key=lambda row: (row[1] is not None, row[1] or "",
+                                                              row[2] is not None, row[2] or "")))
+        results = [shard._read(search_params, view) for shard in self._shards]
+        if any(result == -1 for result in results):
+            return -1
+        if view == "exists":
+            return any(results)
+        projection = ContactsDB._views[view] if isinstance(view, str) else view
+        if "first_name" not in projection or "last_name" not in projection:
+            return [row for result in results for row in result]
+        first, last = projection.index("first_name"), projection.index("last_name")
+        return list(heapq.merge(*results, key=lambda row: (row[first] is not None, row[first] or "",
+                                                           row[last] is not None, row[last] or "")))
+
+    def _read_page(self, search_params: dict, page=0, page_size=10, view="preview") -> list:
+        """
+        Read one page of the found rows from all shards, see ContactsDB._read_page
+        """
+        rows = self._read(search_params, view)
+        return rows[page * page_size:(page + 1) * page_size] if rows != -1 else list()
+
+    def _is_name_exist(self, first_name: str, last_name: str):
+        """
+        Check the uniqueness of Person Name in all shards, see ContactsDB._is_name_exist
+        :return: 1 - name exists, 0 - name doesn't exist, (-1) - error
+        """
+        return self._read({'first_name': first_name, 'last_name': last_name}, "exists")
+
+    @try_except_decorator
+    def _upcoming_birthdays(self, horizon=None, today=None) -> list:
+        """
+        Find persons with a birthday in the next {horizon} days in all shards
+        :param horizon: window length in days (default - birthday_horizon of the DB)
+        :param today: first day of the window (default - today)
+        :return: list of tuple(person ID, first name, last name, birthday, days until birthday)
+        sorted by days until birthday - success, (-1) - error
+        """
+        upcoming = list()
+        for shard in self._shards:
+            shard_result = shard._upcoming_birthdays(horizon, today)
+            if shard_result == -1:
+                return -1
+            upcoming.extend(shard_result)
+        upcoming.sort(key=lambda x: x[4])
+        return upcoming
+
+    @try_except_decorator
+    def _insert_record(self, person_info: tuple, phone_info: tuple, person_id=None, phone_id=None):
+        """
+        Create a new record about the person and his/her first contact in the shard of the new person
+        :param person_info: person_info - a row of data for Persons table EXCEPT person_ID
+        :param phone_info: phone_info - a row of data for Phones table EXCEPT phone_ID and owner_ID
+        :param person_id: ID for the new person (default - next unused one)
+        :param phone_id: ID for the new phone (default - next unused one)
+        :return: tuple(new person id, new phone id) - success, (-1) - error
+        """
+        person_id = self.__new_id("Persons") if person_id is None else person_id
+        phone_id = self.__new_id("Phones") if phone_id is None else phone_id
+        return self._shard_of(person_id)._insert_record(person_info, phone_info, person_id, phone_id)
+
+    @try_except_decorator
+    def _insert_phone(self, phone_info: tuple, phone_id=None) -> int:
+        """
+        Insert phone information to the shard of its owner
+        :param phone_info - a row of data for Phones table EXCEPT id
+        :param phone_id - ID for the new phone (default - next unused one)
+        :return: inserted phone ID - success, (-1) - error
+        """
+        phone_id = self.__new_id("Phones") if phone_id is None else phone_id
+        return self._shard_of(phone_info[0])._insert_phone(phone_info, phone_id)
+
+    @try_except_decorator
+    def _update_person(self, person_info: tuple) -> int:
+        """
+        Update person information in his/her shard
+        :param person_info - a row of data for Persons table with new info; None if no changes are in need
+        :return: 1 - success, (-1) - error
+        """
+        return self._shard_of(person_info[0])._update_person(person_info)
+
+    @try_except_decorator
+    def _update_phone(self, phone_info: tuple) -> int:
+        """
+        Update phone information, the phone is moved to another shard with its new owner if necessary
+        (it is inserted to the new shard first, so it is not lost if the move fails)
+        :param phone_info - a row of data for Phones table with new info; None if no changes are in need
+        :return: 1 - success, (-1) - error
+        """
+        shard = self.__phone_shard(phone_info[0])
+        if shard is None:
+            return 1
+        if phone_info[1] is None or self._shard_of(phone_info[1]) is shard:
+            return shard._update_phone(phone_info)
+
+        old_phone = shard.SQL_coursor.execute("SELECT * FROM Phones WHERE id = ?", (phone_info[0],)).fetchone()
+        new_phone = [new if new is not None else old for new, old in zip(phone_info, old_phone)]
+        new_shard = self._shard_of(phone_info[1])
+        if new_shard._insert_phone(tuple(new_phone[1:]), phone_info[0]) == -1:
+            return -1
+        if shard._delete_phone(phone_info[0]) == -1:
+            new_shard._delete_phone(phone_info[0])
+            return -1
         return 1
 
     @try_except_decorator
     def _delete_person(self, person_id) -> int:
         """
-        Delete the person information by the column and its value
-        + delete all phones of this person
+        Delete the person and all his/her phones from the shard
         :param person_id: the person to delete
         :return: 1 - success, (-1) - error
         """
-        self.SQL_coursor.execute(
-            '''
-            DELETE FROM Persons
-            WHERE id = ?;
-            
-            ''', (person_id,)
-        )
-        self.SQL_coursor.execute(
-            '''
-            DELETE FROM Phones
-            WHERE owner = ?
-            ''', (person_id,)
-        )
-        return 1
+        return self._shard_of(person_id)._delete_person(person_id)
 
     @try_except_decorator
     def _delete_phone(self, phone_id) -> int:
         """
-        Delete the phone information by the column and its value
-
+        Delete the phone from its shard
         :param phone_id: the phone to delete
         :return: 1 - success, (-1) - error
         """
-        self.SQL_coursor.execute(
-            '''
-            DELETE FROM Phones
-            WHERE id = ?
-            ''', (phone_id,)
-        )
-
-        # if we deleted the only one phone number of a person we should delete a person too
-        self._clean_db()
-        return 1
+        shard = self.__phone_shard(phone_id)
+        return shard._delete_phone(phone_id) if shard is not None else 1
 
     @try_except_decorator
     def _clean_db(self) -> int:
         """
-        Delete persons without phone numbers from the table
+        Delete persons without phone numbers from all shards
         :return: 1 - success, (-1) - error
         """
-        self.SQL_coursor.execute(
-            '''
-            DELETE FROM Persons
-            WHERE Persons.id NOT IN (
-            SELECT Persons.id FROM Persons, Phones
-            WHERE Persons.id = Phones.owner
-            )
-
-            ''')
+        for shard in self._shards:
+            if shard._clean_db() == -1:
+                return -1
         return 1
 
-    @try_except_decorator
-    def __persons_length(self) -> int:
+
+class WriteQueue:
+    """
+    The single writer of the DB file for concurrent producers (threads, scripts, services)
+    Operations are taken from the queue by the writer thread and applied in batches:
+    one transaction (group commit) per batch, runs of the same operation are executed by executemany
+    Every operation returns a Future with its result (new IDs for inserts)
+    The tables must be created by ContactsDB before
+    """
+
+    def __init__(self, db_name="phones_db.sqlite", max_batch=1000, max_delay=0.002, busy_timeout=5.0):
         """
-        function to calculate the length of Persons table
-        :return: number of rows in the table
+        :param db_name: name of DB file
+        :param max_batch: maximum number of operations in one transaction
+        :param max_delay: how long (in seconds) the writer waits for more operations before the commit
+        :param busy_timeout: how long (in seconds) the writer waits for the lock of another connection
+        """
+        self.__connection = sqlite3.connect(db_name, timeout=busy_timeout, isolation_level=None,
+                                            check_same_thread=False)
+        self.__max_batch = max_batch
+        self.__max_delay = max_delay
+        self.__queue = queue.Queue()
+        self.__metrics = {"operations": 0, "batches": 0, "failed_operations": 0}
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    """
+    Operations: every one returns Future
+    """
+    def insert_record(self, person_info: tuple, phone_info: tuple) -> Future:
         """
-        self.SQL_coursor.execute(
-            '''
-            SELECT COUNT(id) from Persons
-            '''
-        )
-        return int(self.SQL_coursor.fetchone()[0])
+        :param person_info: (first name, last name, birthday, is favourite)
+        :param phone_info: (number, description)
+        :return: Future of tuple(new person ID, new phone ID)
+        """
+        return self.__submit("insert_record", person_info, phone_info)
 
-    @try_except_decorator
-    def __phones_length(self) -> int:
+    def insert_phone(self, phone_info: tuple) -> Future:
         """
-        function to calculate the length of Phones table
-        :return: number of rows in the table
+        :param phone_info: (owner ID, number, description)
+        :return: Future of the new phone ID
         """
-        self.SQL_coursor.execute(
-            '''
-            SELECT COUNT(id) from Phones
-            '''
-        )
-        return int(self.SQL_coursor.fetchone()[0])
+        return self.__submit("insert_phone", phone_info)
 
-    @try_except_decorator
-    def __persons_max_index(self) -> int:
+    def update_person(self, person_info: tuple) -> Future:
         """
-        function to calculate new index for Persons table
-        :return: new index
+        :param person_info: (person ID, first name, last name, birthday, is favourite), None - no changes
+        :return: Future of 1
         """
-        self.SQL_coursor.execute(
-            '''
-            SELECT MAX(id) from Persons
-            '''
-        )
-        return int(self.SQL_coursor.fetchone()[0])
+        return self.__submit("update_person", person_info)
 
-    @try_except_decorator
-    def __phones_max_index(self) -> int:
+    def update_phone(self, phone_info: tuple) -> Future:
         """
-        function to calculate new index for Phones table
-        :return: new index
+        Persons left without phones are deleted
+        :param phone_info: (phone ID, owner ID, number, description), None - no changes
+        :return: Future of 1
         """
-        self.SQL_coursor.execute(
-            '''
-            SELECT MAX(id) from Phones
-            '''
+        return self.__submit("update_phone", phone_info)
+
+    def delete_person(self, person_id: int) -> Future:
+        """
+        Delete the person with all his/her phones
+        :return: Future of 1
+        """
+        return self.__submit("delete_person", (person_id,))
+
+    def delete_phone(self, phone_id: int) -> Future:
+        """
+        Delete the phone, the person left without phones is deleted too
+        :return: Future of 1
+        """
+        return self.__submit("delete_phone", (phone_id,))
+
+    def close(self):
+        """
+        Apply all queued operations and stop the writer
+        :return: None
+        """
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__connection.close()
+
+    def metrics(self) -> dict:
+        """
+        :return: dict with keys: operations, batches, failed_operations
+        """
+        return dict(self.__metrics)
+
+    """
+    Arguments of the operations: kinds of the values in every tuple
+    """
+    __arguments = {
+        "insert_record": (("text", "text", "text", "flag"), ("text", "text")),
+        "insert_phone": (("id", "text", "text"),),
+        "update_person": (("id", "text", "text", "text", "flag"),),
+        "update_phone": (("id", "id or None", "text", "text"),),
+        "delete_person": (("id",),),
+        "delete_phone": (("id",),),
+    }
+    __kinds = {"text": (str, type(None)), "flag": (int, type(None)), "id": (int,), "id or None": (int, type(None))}
+
+    def __submit(self, operation: str, *infos) -> Future:
+        """
+        Put the operation to the queue, the future of the operation with incorrect arguments fails at once
+        :param operation: operation name
+        :param infos: tuples of the operation arguments
+        :return: Future
+        """
+        future = Future()
+        try:
+            args = self.__check(operation, infos)
+        except (TypeError, ValueError) as e:
+            future.set_exception(e)
+            return future
+        self.__queue.put((operation, args, future))
+        return future
+
+    @classmethod
+    def __check(cls, operation: str, infos: tuple):
+        """
+        Check the number and the types of the operation arguments (see __arguments)
+        :return: checked tuple, or tuple of the checked tuples for several ones
+        """
+        checked = list()
+        for info, kinds in zip(infos, cls.__arguments[operation]):
+            if not isinstance(info, (tuple, list)):
+                raise TypeError(operation + ": tuple expected, got " + repr(info))
+            if len(info) != len(kinds):
+                raise ValueError(operation + ": " + str(len(kinds)) + " values expected, got " + repr(info))
+            for value, kind in zip(info, kinds):
+                if not isinstance(value, cls.__kinds[kind]):
+                    raise TypeError(operation + ": " + kind + " expected, got " + repr(value))
+            checked.append(tuple(info))
+        return tuple(checked) if len(checked) > 1 else checked[0]
+
+    """
+    Writer thread
+    """
+    def __run(self):
+        stopped = False
+        while not stopped:
+            item = self.__queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.__max_delay
+            while len(batch) < self.__max_batch:
+                try:
+                    item = self.__queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            self.__apply(batch)
+
+    def __apply(self, batch: list):
+        """
+        Apply the batch in one transaction and resolve the futures
+        If a group of the same operations fails, its operations are applied one by one,
+        so only the incorrect ones fail; if the transaction fails, it is rolled back and all operations fail
+        Cancelled operations are skipped
+        :param batch: list of tuple(operation, args, future)
+        :return: None
+        """
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = list()
+        try:
+            self.__connection.execute("BEGIN IMMEDIATE")
+            next_ids = {table: self.__connection.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM " + table).fetchone()[0] for table in ("Persons", "Phones")}
+            for operation, group in itertools.groupby(batch, key=lambda item: item[0]):
+                rows = [item[1] for item in group]
+                apply_group = getattr(self, "_WriteQueue__" + operation)
+                try:
+                    results.extend(self.__in_savepoint(apply_group, next_ids, rows))
+                except Exception:
+                    for row in rows:
+                        try:
+                            results.extend(self.__in_savepoint(apply_group, next_ids, [row]))
+                        except Exception as e:
+                            results.append(e)
+            if any(item[0] in ("update_phone", "delete_phone") for item in batch):
+                self.__connection.execute(
+                    '''
+                    DELETE FROM Persons
+                    WHERE id NOT IN (SELECT owner FROM Phones WHERE owner IS NOT NULL)
+                    '''
+                )
+            self.__connection.execute("COMMIT")
+        except Exception as e:
+            if self.__connection.in_transaction:
+                try:
+                    self.__connection.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            results = [e] * len(batch)
+
+        self.__metrics["batches"] += 1
+        self.__metrics["operations"] += len(batch)
+        for (operation, args, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                self.__metrics["failed_operations"] += 1
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def __in_savepoint(self, apply_group, next_ids: dict, rows: list) -> list:
+        saved_ids = dict(next_ids)
+        self.__connection.execute("SAVEPOINT write_group")
+        try:
+            results = apply_group(next_ids, rows)
+        except BaseException:
+            self.__connection.execute("ROLLBACK TO write_group")
+            next_ids.update(saved_ids)
+            raise
+        finally:
+            self.__connection.execute("RELEASE write_group")
+        return results
+
+    @staticmethod
+    def __new_ids(next_ids: dict, table: str, count: int) -> range:
+        ids = range(next_ids[table], next_ids[table] + count)
+        next_ids[table] += count
+        return ids
+
+    @staticmethod
+    def __birthday_row(person_id: int, birthday: str) -> tuple:
+        """
+        Row of Birthdays index table (see ContactsDB.__index_birthday)
+        """
+        day, month, year = (int(x) for x in birthday.split('-'))
+        datetime.date(year, month, day)
+        return person_id, StorageFormat.birthday_to_storage(birthday), BirthdayCalculator.birthday_key(month, day), year
+
+    def __index_birthdays(self, rows: list):
+        """
+        :param rows: list of tuple(person ID, birthday or None)
+        """
+        self.__connection.executemany(
+            "INSERT OR REPLACE INTO Birthdays VALUES (?, ?, ?, ?)",
+            [self.__birthday_row(person_id, birthday) for person_id, birthday in rows if birthday is not None]
         )
-        return int(self.SQL_coursor.fetchone()[0])
 
-    def _read_all_persons(self):
-        return self.SQL_coursor.execute(
-            '''
-            SELECT * FROM Persons
-            '''
+    def __insert_record(self, next_ids: dict, rows: list) -> list:
+        person_ids = self.__new_ids(next_ids, "Persons", len(rows))
+        phone_ids = self.__new_ids(next_ids, "Phones", len(rows))
+        self.__connection.executemany(
+            "INSERT INTO Persons VALUES (?, ?, ?, ?, ?)",
+            [(person_id,) + StorageFormat.person(person_info)
+             for person_id, (person_info, phone_info) in zip(person_ids, rows)]
+        )
+        self.__connection.executemany(
+            "INSERT INTO Phones VALUES (?, ?, ?, ?)",
+            [(phone_id,) + StorageFormat.phone((person_id,) + phone_info)
+             for phone_id, person_id, (person_info, phone_info) in zip(phone_ids, person_ids, rows)]
+        )
+        self.__index_birthdays([(person_id, person_info[2]) for person_id, (person_info, phone_info)
+                                in zip(person_ids, rows)])
+        return list(zip(person_ids, phone_ids))
+
+    def __insert_phone(self, next_ids: dict, rows: list) -> list:
+        phone_ids = self.__new_ids(next_ids, "Phones", len(rows))
+        self.__connection.executemany(
+            "INSERT INTO Phones VALUES (?, ?, ?, ?)",
+            [(phone_id,) + StorageFormat.phone(phone_info) for phone_id, phone_info in zip(phone_ids, rows)]
         )
+        return list(phone_ids)
 
-    def _read_all_phones(self):
-        return self.SQL_coursor.execute(
+    def __update_person(self, next_ids: dict, rows: list) -> list:
+        self.__connection.executemany(
             '''
-            SELECT * FROM Phones
+            UPDATE Persons
+            SET first_name = COALESCE(?, first_name), last_name = COALESCE(?, last_name),
+            birthday = COALESCE(?, birthday), is_favourite = COALESCE(?, is_favourite)
+            WHERE id = ?
+            ''', [StorageFormat.person(person_info[1:]) + person_info[:1] for person_info in rows]
+        )
+        self.__index_birthdays([(person_info[0], person_info[3]) for person_info in rows])
+        return [1] * len(rows)
+
+    def __update_phone(self, next_ids: dict, rows: list) -> list:
+        self.__connection.executemany(
             '''
+            UPDATE Phones
+            SET owner = COALESCE(?, owner), number = COALESCE(?, number),
+            description = COALESCE(?, description)
+            WHERE id = ?
+            ''', [StorageFormat.phone(phone_info[1:]) + phone_info[:1] for phone_info in rows]
         )
+        return [1] * len(rows)
+
+    def __delete_person(self, next_ids: dict, rows: list) -> list:
+        self.__connection.executemany("DELETE FROM Persons WHERE id = ?", rows)
+        self.__connection.executemany("DELETE FROM Phones WHERE owner = ?", rows)
+        return [1] * len(rows)
+
+    def __delete_phone(self, next_ids: dict, rows: list) -> list:
+        self.__connection.executemany("DELETE FROM Phones WHERE id = ?", rows)
+        return [1] * len(rows)
 
 
 class ContactsDBInterface(ContactsDB):
@@ -418,9 +2622,14 @@ class ContactsDBInterface(ContactsDB):
     Interface for work with the Contacts Data Base
     """
 
-    def __init__(self, db_name="phones_db.sqlite", auto_save=True):
-        super().__init__(db_name=db_name, auto_save=auto_save)
+    def __init__(self, db_name="phones_db.sqlite", auto_save=True, birthday_horizon=30,
+                 in_memory=False, flush_interval=60, profile="interactive", pragmas=None, busy_timeout=5.0,
+                 live_search_delay=0.3):
+        super().__init__(db_name=db_name, auto_save=auto_save, birthday_horizon=birthday_horizon,
+                         in_memory=in_memory, flush_interval=flush_interval, profile=profile, pragmas=pragmas,
+                         busy_timeout=busy_timeout)
         self.Format = FormatChecker()
+        self.__live_search_delay = live_search_delay
 
         self.__selected_hor = 0
         self.__selected_ver = 0
@@ -473,6 +2682,19 @@ class ContactsDBInterface(ContactsDB):
 
         self.__filled_params = tuple()
 
+        """
+        Live search in the search editor: results are shown while the value is typed
+        names, phone and description are looked up by the typed prefix
+        """
+        self.__live_search = None
+        self.__live_page = 0
+        self.__live_rows = None
+        self.__typing = False
+        self.__typed = ""
+        self.__search_fields = ("int", "name", "name", "short_birthday", "age", "bool", "number", "skip")
+        self.__prefix_params = {1: "first_name_prefix", 2: "last_name_prefix",
+                                6: "phone_number_prefix", 7: "phone_description_prefix"}
+
         self._exit_flag = False
 
         # Prints
@@ -484,6 +2706,7 @@ class ContactsDBInterface(ContactsDB):
                                " auto save ="
         self.__main_window_instructions = " [q] - to exit, [s] - to search, [c] - to clear search\n" \
                                           " [d] - to delete person, [shift]+[d] - to delete phone\n" \
+                                          " [x] - to delete all found persons, [shift]+[x] - all found phones\n" \
                                           " [u] - to update person, [shift]+[u] - to update phone\n" \
                                           " [n] - to create record, [shift]+[n] - to insert phone\n" \
                                           " [b] - to see nearest birthdays\n" \
@@ -492,13 +2715,14 @@ class ContactsDBInterface(ContactsDB):
         self.__search_window_instructions = " [q] - to save and exit, [c] - to clear search\n" \
                                             "    [e] then [ENTER] - to edit search param   \n" \
                                             "     use arrows to navigate - [<-], [->]    \n" \
+                                            "  results pages - [up], [down]  \n" \
                                             "\n SEARCH PARAMS: \n"
         self.__edit_window_instructions = " [q] - to save and exit                  \n" \
                                           " [e] then [ENTER] - to edit search param \n" \
                                           "   use arrows to navigate - [<-], [->] \n" \
                                           "\n EDIT VALUES: \n"
         self.__birthday_window_instructions = " [q] - to exit\n" \
-                                              "\n NEAREST BIRTHDAYS (in 30 days): \n"
+                                              "\n NEAREST BIRTHDAYS (in " + str(birthday_horizon) + " days): \n"
         self.__instructions_label = " Use keyboard to control the interface: "
 
     def start(self):
@@ -515,6 +2739,8 @@ class ContactsDBInterface(ContactsDB):
         keyboard.add_hotkey('down', self.__arrow_down)
         keyboard.add_hotkey('d', self.__delete_person_bt)
         keyboard.add_hotkey('shift + d', self.__delete_phone_bt)
+        keyboard.add_hotkey('x', self.__bulk_delete_bt, (self._bulk_delete_persons,))
+        keyboard.add_hotkey('shift + x', self.__bulk_delete_bt, (self._bulk_delete_phones,))
         keyboard.add_hotkey('q', self.__exit)
         keyboard.add_hotkey('e', self.__get_input)
         keyboard.add_hotkey('s', self.__read_search_params)
@@ -525,6 +2751,9 @@ class ContactsDBInterface(ContactsDB):
         keyboard.add_hotkey('shift + u', self.__read_edit_params, (4,))
         keyboard.add_hotkey('shift + s', self._save)
         keyboard.add_hotkey('b', self.__draw_birthday_window)
+        keyboard.on_press(self.__on_key_press)
+        self.__live_search = LiveSearch(self.SQL_connection, self._read_page, self.__show_live_result,
+                                        self.__live_search_delay)
 
         self.__reload_main_window()
 
@@ -541,6 +2770,8 @@ class ContactsDBInterface(ContactsDB):
                 self._exit_flag = False
                 if self.__edit_mode == 0:
                     # search mode
+                    self.__live_search.cancel()
+                    self.__live_rows = None
                     self.__input_search_params = self.__editor_table[1]
                     if self.__handle_search(self.__input_search_params) == -1:
                         continue
@@ -574,6 +2805,7 @@ class ContactsDBInterface(ContactsDB):
                 self.__reload_main_window()
             continue
 
+        self.__live_search.stop()
         self.__del__()
 
     """
@@ -586,6 +2818,15 @@ class ContactsDBInterface(ContactsDB):
         :param input_params: params to handle for search
         :return: 1 - success, (-1) - error
         """
+        self.__saved_search_params = self.__search_params(input_params)
+        return 1
+
+    def __search_params(self, input_params: tuple) -> dict:
+        """
+        Convert the values of the search editor to the search params of ContactsDB
+        :param input_params: values of the search editor
+        :return: dict of search params, see ContactsDB._read
+        """
         conformity_list = ("person_ID", "first_name", "last_name", None, None, "is_favourite",
                            "phone_number", "phone_description")
         temp_dict = dict()
@@ -600,9 +2841,57 @@ class ContactsDBInterface(ContactsDB):
             age = input_params[4].split('-')
             temp_dict['age_from'] = int(age[0])
             temp_dict['age_to'] = int(age[1]) if len(age) > 1 else int(age[0])
+        return temp_dict
+
+    def __live_search_params(self) -> dict:
+        """
+        Search params for the live search: the values of the search editor + the value being typed
+        Names, phone and description are looked up by the typed prefix,
+        other typed values are used when they are already correct
+        :return: dict of search params, see ContactsDB._read
+        """
+        input_params = list(self.__editor_table[1])
+        typed = self.__typed.strip()
+        prefix = None
+        if self.__typing and typed:
+            field = self.__search_fields[self.__selected_ver]
+            if self.__selected_ver in self.__prefix_params:
+                input_params[self.__selected_ver] = ""
+                if field == "name":
+                    prefix = typed[0].upper() + typed[1:]
+                elif field == "number":
+                    prefix = "8" + typed[2:] if typed.startswith("+7") else typed
+                else:
+                    prefix = typed
+            else:
+                correct_value = getattr(FormatChecker, "_valid_" + field)(typed)
+                if correct_value is not None:
+                    input_params[self.__selected_ver] = correct_value
+        search_params = self.__search_params(tuple(input_params))
+        if prefix is not None:
+            search_params[self.__prefix_params[self.__selected_ver]] = prefix
+        return search_params
+
+    def __update_live_search(self, page=0):
+        """
+        Request the live search by the current values of the search editor
+        :param page: page of the results
+        :return: None
+        """
+        if self.__live_search is not None and self.__edit_mode == 0 and self.__mode in (1, 2):
+            self.__live_page = page
+            self.__live_search.submit(self.__live_search_params(), page)
 
-        self.__saved_search_params = temp_dict
-        return 1
+    def __show_live_result(self, search_params: dict, page: int, rows: list):
+        """
+        Show the live search results under the search editor (called by LiveSearch)
+        :return: None
+        """
+        if self.__edit_mode != 0 or self.__mode not in (1, 2):
+            return
+        self.__live_page = page
+        self.__live_rows = rows
+        self.__draw_editor_window()
 
     @try_except_decorator
     def __handle_new_record(self, input_params: tuple):
@@ -663,7 +2952,7 @@ class ContactsDBInterface(ContactsDB):
        :return: 1 - success, (-1) - error
        """
         input_list = list(input_params)
-        if input_list[0] and len(self._read({'person_ID': input_list[0]})) == 0:
+        if input_list[0] and not self._read({'person_ID': input_list[0]}, "exists"):
             print(" *** ERROR *** : such Person does not exist")
             return -1
         phone_id = int(self.__last_table[self.__selected_hor][5])
@@ -696,6 +2985,8 @@ class ContactsDBInterface(ContactsDB):
                 self.__selected_hor -= 1
             self._clear_screen()
             self.__draw_main_window()
+        elif self.__mode == 1 and self.__edit_mode == 0 and self.__live_page > 0:
+            self.__update_live_search(self.__live_page - 1)
 
     def __arrow_down(self):
         if self.__mode == 0:
@@ -703,6 +2994,26 @@ class ContactsDBInterface(ContactsDB):
                 self.__selected_hor += 1
             # self._clear_screen()
             self.__draw_main_window()
+        elif self.__mode == 1 and self.__edit_mode == 0 and self.__live_rows:
+            self.__update_live_search(self.__live_page + 1)
+
+    def __on_key_press(self, event):
+        """
+        Collect the value typed in the search editor for the live search
+        :param event: keyboard event
+        :return: None
+        """
+        if not self.__typing:
+            return
+        if event.name == "backspace":
+            self.__typed = self.__typed[:-1]
+        elif event.name == "space":
+            self.__typed += " "
+        elif event.name is not None and len(event.name) == 1:
+            self.__typed += event.name
+        else:
+            return
+        self.__update_live_search()
 
     @try_except_decorator
     def __delete_person_bt(self):
@@ -728,6 +3039,34 @@ class ContactsDBInterface(ContactsDB):
             self.__reload_main_window()
             return 1
 
+    @try_except_decorator
+    def __bulk_delete_bt(self, bulk_delete):
+        """
+        Hot key function for delete of all found records
+        Does nothing without search params to avoid deleting the whole DB,
+        the numbers of the records to delete are shown and the delete must be confirmed
+        :param bulk_delete: _bulk_delete_persons or _bulk_delete_phones
+        :return: None
+        """
+        if self.__mode == 0 and len(self.__last_table) > 0 and self.__saved_search_params:
+            counts = self._bulk_delete_counts(self.__saved_search_params)
+            if counts == -1:
+                return
+            if bulk_delete == self._bulk_delete_persons:
+                question = "System: %d persons with all their %d phones will be deleted" % counts[:2]
+            else:
+                question = "System: %d phones will be deleted (+ %d persons left without phones)" % counts[2:]
+            self.__mode = 2
+            try:
+                input(" \nSystem: PRESS ENTER PLEASE\n")
+                answer = input(question + "\nType 'yes' to confirm: ")
+            finally:
+                self.__mode = 0
+            if answer.strip().lower() == "yes":
+                bulk_delete(self.__saved_search_params)
+            self.__reload_main_window()
+            return 1
+
     @try_except_decorator
     def __read_search_params(self, forced=False):
         """
@@ -743,6 +3082,7 @@ class ContactsDBInterface(ContactsDB):
             tuple(self.__input_search_params)]
 
         self.__draw_editor_window()
+        self.__update_live_search()
 
     @try_except_decorator
     def __read_edit_params(self, edit_mode: int):
@@ -797,7 +3137,10 @@ class ContactsDBInterface(ContactsDB):
             self.__mode = 2
             input(" \nSystem: PRESS ENTER PLEASE\n")
             self.__draw_editor_window()
+            self.__typed = ""
+            self.__typing = self.__edit_mode == 0
             cell = input("Your value: ")
+            self.__typing = False
             edit_name = list(self.__format_headers.keys())[self.__edit_mode]
             correct_cell = self.__format_headers[edit_name][self.__selected_ver](cell) if cell else ""
             if correct_cell == -1:
@@ -806,8 +3149,9 @@ class ContactsDBInterface(ContactsDB):
             last_values = list(self.__editor_table[1])
             last_values[self.__selected_ver] = correct_cell
             self.__editor_table[1] = tuple(last_values)
-            self.__draw_editor_window()
             self.__mode = 1
+            self.__draw_editor_window()
+            self.__update_live_search()
 
     """
     Draw functions
@@ -839,6 +3183,12 @@ class ContactsDBInterface(ContactsDB):
         print(self.__instructions_label)
         print(self.__search_window_instructions if self.__edit_mode == 0 else self.__edit_window_instructions)
         print(tb(rows + [tuple(arrow)], headers='firstrow', tablefmt='grid'))
+        if self.__edit_mode == 0 and self.__live_rows is not None:
+            print("\n FOUND (page " + str(self.__live_page + 1) + "): \n")
+            print(tb([("ID", "First Name", "Last Name", "Birthday", "Phone", "Description")] + self.__live_rows,
+                     headers='firstrow', tablefmt='grid'))
+        if self.__typing:
+            print("Your value: " + self.__typed, end="", flush=True)
 
     @try_except_decorator
     def __draw_main_window(self):
@@ -865,6 +3215,10 @@ class ContactsDBInterface(ContactsDB):
 
         self._clear_screen()
         print(self.__name_to_print, self._auto_save, "\n")
+        stats = self._stats()
+        if stats != -1:
+            print(" persons:", stats["persons"], "| phones:", stats["phones"],
+                  "| favourites:", stats["favourites"], "\n")
         print(self.__instructions_label)
         print(self.__main_window_instructions)
         print(tb([self.__table_headers['main']] + values, headers='firstrow', tablefmt='grid'))
@@ -872,9 +3226,9 @@ class ContactsDBInterface(ContactsDB):
     @try_except_decorator
     def __draw_birthday_window(self):
         self.__mode = 3
-        result = self._read({"is_nearest_birthday": True})
-        edited_result = [tuple(list(record)[1:4]) for record in result]
-        headers = ("First name", "Last name", "Birthday")
+        result = self._upcoming_birthdays()
+        edited_result = [tuple(list(record)[1:5]) for record in result]
+        headers = ("First name", "Last name", "Birthday", "Days left")
         self._clear_screen()
         print(self.__name_to_print, self._auto_save, "\n")
         print(self.__instructions_label)
@@ -898,141 +3252,289 @@ class ContactsDBInterface(ContactsDB):
         """
         self._exit_flag = True
 
+    @staticmethod
+    def _stats_table(stats: dict) -> str:
+        """
+        Format DB statistics (see ContactsDB._stats) as a table
+        :return: table string
+        """
+        rows = [("Persons", stats["persons"]), ("Phones", stats["phones"]), ("Favourites", stats["favourites"])]
+        rows += [("Persons with " + str(phones) + " phone(s)", persons)
+                 for phones, persons in stats["phones_per_person"].items()]
+        rows += [("Birthdays in " + datetime.date(2000, month, 1).strftime("%B"), persons)
+                 for month, persons in stats["birthdays_per_month"].items()]
+        rows += [("Age " + str(bucket) + "-" + str(bucket + 9), persons)
+                 for bucket, persons in stats["age_buckets"].items()]
+        return tb(rows, tablefmt='grid')
+
 
 class FormatChecker:
+    """
+    Check and normalize the format of user input
+    check_* functions check one value and print the problem,
+    check_rows / check_column check whole rows / columns and return structured errors
+    """
+
+    _name_pattern = re.compile(r"[^\W_]*(?: [^\W_]*)*")
+    _number_pattern = re.compile(r"(?:\+7|(\d))(\d{10})")
+    _birthday_patterns = {
+        True: re.compile(r"(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])-(1[0-2]|0[1-9]|[1-9])-(\d\d\d\d)"),
+        False: re.compile(r"(3[01]|[12]\d|0[1-9]|[1-9]| [1-9])-(1[0-2]|0[1-9]|[1-9])")
+    }
+    _age_pattern = re.compile(r"(\d+)(?:-(\d+))?")
+    _month_days = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+    _messages = {
+        "name": "please use only alphabet, numeric symbols or SPACEs! ",
+        "number": "please enter the correct phone number (11 digits or 12 digits with '+' start)! ",
+        "full_birthday": "please enter birth date in a format dd-mm-yyyy",
+        "short_birthday": "please enter birth date in a format dd-mm",
+        "int": "please enter the integer number! ",
+        "bool": "please enter something for True or left empty for False! ",
+        "age": "please enter one age as an integer number\n"
+               "or an age interval in format {age1}-{age2} where age1 <= age2 ! "
+    }
+    # problems of the row structure found by check_rows
+    _row_messages = {
+        "missing": "the value is missing (the row is too short)",
+        "type": "the value must be a string",
+        "extra": "unexpected value (the row is too long)"
+    }
 
     def __init__(self):
         pass
 
+    """
+    Validators: value -> normalized value or None if the value is incorrect
+    """
+    @classmethod
+    def _valid_name(cls, value: str):
+        correct_name = value.strip()
+        if not correct_name or cls._name_pattern.fullmatch(correct_name) is None:
+            return None
+        return correct_name[0].upper() + correct_name[1:]
+
+    @classmethod
+    def _valid_number(cls, value: str):
+        match = cls._number_pattern.fullmatch(value.strip())
+        if match is None:
+            return None
+        return (match.group(1) or "8") + match.group(2)
+
+    @classmethod
+    def _valid_full_birthday(cls, value: str):
+        match = cls._birthday_patterns[True].fullmatch(value.strip())
+        if match is None:
+            return None
+        day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+        if year < 1 or day > cls._month_days[month] or \
+                (month == 2 and day == 29 and not BirthdayCalculator.is_leap_year(year)):
+            return None
+        return "%02d-%02d-%04d" % (day, month, year)
+
+    @classmethod
+    def _valid_short_birthday(cls, value: str):
+        match = cls._birthday_patterns[False].fullmatch(value.strip())
+        if match is None:
+            return None
+        day, month = int(match.group(1)), int(match.group(2))
+        if day > cls._month_days[month]:
+            return None
+        return "%02d-%02d" % (day, month)
+
     @staticmethod
-    def check_name(input_name: str):
+    def _valid_int(value: str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _valid_bool(value: str):
+        correct_bool = value.strip()
+        return False if correct_bool == '0' else bool(correct_bool)
+
+    @classmethod
+    def _valid_age(cls, value: str):
+        correct_age = value.strip()
+        match = cls._age_pattern.fullmatch(correct_age)
+        if match is None or (match.group(2) is not None and int(match.group(1)) > int(match.group(2))):
+            return None
+        return correct_age
+
+    @staticmethod
+    def _valid_skip(value):
+        return value
+
+    @classmethod
+    def __check(cls, field: str, value):
+        """
+        Check one value and print the problem
+        :return: normalized value - success, (-1) - value is fully incorrect
+        """
+        correct_value = getattr(cls, "_valid_" + field)(value)
+        if correct_value is None:
+            print(" *** FORMAT ERROR *** : " + cls._messages[field])
+            return -1
+        return correct_value
+
+    @classmethod
+    def check_name(cls, input_name: str):
         """
         Check the name format
         :param input_name: birthday you want to check
         :return: the correct name (str) - success, (-1) - input_name is fully incorrect
         """
-        correct_name = input_name.strip()
-        for x in correct_name.split(' '):
-            if not (x.isalnum() or x == ''):
-                print(" *** FORMAT ERROR *** : please use only alphabet, numeric symbols or SPACEs! ")
-                return -1
-        correct_name = correct_name[0].upper() + correct_name[1:]
-        return correct_name
+        return cls.__check("name", input_name)
 
-    @staticmethod
-    def check_number(input_number: str):
+    @classmethod
+    def check_number(cls, input_number: str):
         """
         Check the number format
         :param input_number: number you want to check
         :return: the correct number (str) - success, (-1) - input_number is fully incorrect
         """
-        correct_number = "" + input_number.strip()
-        while True:
-            if len(correct_number) not in (11, 12):
-                break
-
-            if len(correct_number) == 12:
-                if correct_number[:2] == "+7":
-                    correct_number = "8" + correct_number[2:]
-                else:
-                    break
-
-            if not correct_number.isnumeric():
-                break
-
-            return correct_number
+        return cls.__check("number", input_number)
 
-        print(" *** FORMAT ERROR *** : please enter the correct phone number (11 digits or 12 digits with '+' start)! ")
-        return -1
-
-    def check_full_birthday(self, input_birthday: str):
-        return self.__check_birthday(input_birthday)
-
-    def check_short_birthday(self, input_birthday: str):
-        return self.__check_birthday(input_birthday, full_date=False)
+    @classmethod
+    def check_full_birthday(cls, input_birthday: str):
+        """
+        Check the birthday format {dd-mm-yyyy}
+        :param input_birthday: birthday you want to check
+        :return: the correct birthday (str) - success, (-1) - input_birthday is fully incorrect
+        """
+        return cls.__check("full_birthday", input_birthday)
 
-    @staticmethod
-    def __check_birthday(input_birthday: str, full_date=True):
+    @classmethod
+    def check_short_birthday(cls, input_birthday: str):
         """
-        Check the birthday format
+        Check the birthday format {dd-mm}
         :param input_birthday: birthday you want to check
-        :param full_date: True - {dd-mm-yyyy}, False - {dd-mm}
         :return: the correct birthday (str) - success, (-1) - input_birthday is fully incorrect
         """
-        correct_birthday = input_birthday.strip()
-        try:
-            birthday_format = '%d-%m-%Y' if full_date else '%d-%m'
-            datetime.datetime.strptime(correct_birthday, birthday_format)
-            return correct_birthday
-        except Exception as e:
-            format_message = "dd-mm-yyyy" if full_date else "dd-mm"
-            print(" *** FORMAT ERROR *** : please enter birth date in a format " + format_message)
-            return -1
+        return cls.__check("short_birthday", input_birthday)
 
-    @staticmethod
-    def check_int(input_integer: str):
+    @classmethod
+    def check_int(cls, input_integer: str):
         """
         Check the string is an integer number
         :param input_integer: string number you want to check
         :return: integer number (int) - success, (-1) - input_integer is fully incorrect
         """
-        correct_integer = input_integer.strip()
-        try:
-            correct_integer = int(correct_integer)
-            return correct_integer
-        except Exception as e:
-            print(" *** FORMAT ERROR *** : please enter the integer number! ")
-            return -1
+        return cls.__check("int", input_integer)
 
-    @staticmethod
-    def check_bool(input_bool: str):
+    @classmethod
+    def check_bool(cls, input_bool: str):
         """
         Check the string is an bool value
         :param input_bool: string bool you want to check
         :return: True/False (bool) - success, (-1) - input_integer is fully incorrect
         """
-        correct_bool = input_bool.strip()
-        try:
-            if correct_bool == '0':
-                return False
-            correct_bool = bool(correct_bool)
-            return correct_bool
-        except Exception as e:
-            print(" *** FORMAT ERROR *** : please enter something for True or left empty for False! ")
-            return -1
+        return cls.__check("bool", input_bool)
 
-    @staticmethod
-    def check_age(input_age: str):
+    @classmethod
+    def check_age(cls, input_age: str):
         """
         Check if the input string can be converted to the age interval
         :param input_age: age as string
         :return: 1 - success, (-1) - input_age is fully incorrect
         """
-        correct_age = input_age.strip()
-        splitted = correct_age.split('-')
-        while True:
-            if len(splitted) > 2:
-                break
-            if len(splitted) == 2 and splitted[0] > splitted[1]:
-                break
-            for x in splitted:
-                if not x.isnumeric():
-                    break
-            else:
-                return correct_age
-            break
-
-        print(" *** FORMAT ERROR *** : please enter one age as an integer number\n"
-              "or an age interval in format {age1}-{age2} where age1 <= age2 ! ")
-        return -1
+        return cls.__check("age", input_age)
 
     @staticmethod
     def check_skip(input_value):
         return input_value
 
-
-"""
-Just create a class copy and call start() function
-"""
-ui = ContactsDBInterface(auto_save=False)
-ui.start()
+    def check_rows(self, rows, fields: tuple) -> tuple:
+        """
+        Check and normalize many rows at once (e.g. before bulk import)
+        Empty values (None or "") are not checked and become None
+        :param rows: iterable of rows (tuples of strings)
+        :param fields: field type of every column: name, number, full_birthday, short_birthday,
+        int, bool, age or skip
+        :return: tuple(list of normalized rows of len(fields) values (None for incorrect and missing values),
+        list of errors - tuple(row index, column index, field type (None for extra values), value, message))
+        """
+        validators = [getattr(self, "_valid_" + field) for field in fields]
+        columns = range(len(fields))
+        normalized_rows = list()
+        errors = list()
+        for row_index, row in enumerate(rows):
+            normalized_row = None
+            if len(row) == len(fields):
+                try:
+                    normalized_row = [None if value is None or value == "" else validator(value)
+                                      for validator, value in zip(validators, row)]
+                except (AttributeError, TypeError):
+                    # not a string value
+                    normalized_row = None
+            if normalized_row is None:
+                normalized_row = self.__check_row(row_index, row, validators, fields, errors)
+            elif None in normalized_row:
+                for column in columns:
+                    if normalized_row[column] is None and row[column]:
+                        errors.append((row_index, column, fields[column], row[column],
+                                       self._messages[fields[column]]))
+            normalized_rows.append(tuple(normalized_row))
+        return normalized_rows, errors
+
+    def __check_row(self, row_index: int, row, validators: list, fields: tuple, errors: list) -> list:
+        """
+        Check the row value by value: missing, extra and not string values are reported too
+        :return: normalized row, the errors are added to {errors}
+        """
+        normalized_row = list()
+        for column, (validator, field) in enumerate(zip(validators, fields)):
+            value = row[column] if column < len(row) else None
+            normalized = None
+            if column >= len(row):
+                errors.append((row_index, column, field, None, self._row_messages["missing"]))
+            elif value is None or value == "":
+                pass
+            elif not isinstance(value, str):
+                errors.append((row_index, column, field, value, self._row_messages["type"]))
+            else:
+                normalized = validator(value)
+                if normalized is None:
+                    errors.append((row_index, column, field, value, self._messages[field]))
+            normalized_row.append(normalized)
+        for column in range(len(fields), len(row)):
+            errors.append((row_index, column, None, row[column], self._row_messages["extra"]))
+        return normalized_row
+
+    def check_column(self, values, field: str) -> tuple:
+        """
+        Check and normalize many values of one field type at once
+        :param values: iterable of strings
+        :param field: field type, see check_rows
+        :return: tuple(list of normalized values (None for incorrect values),
+        list of errors - tuple(index, field type, value, message))
+        """
+        normalized_rows, errors = self.check_rows(((value,) for value in values), (field,))
+        return [row[0] for row in normalized_rows], [(x[0],) + x[2:] for x in errors]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contacts Data Base")
+    parser.add_argument("--db", default="phones_db.sqlite", help="DB file name")
+    parser.add_argument("--birthday-horizon", type=int, default=30, help="days to look for the nearest birthdays")
+    parser.add_argument("--in-memory", action="store_true", help="work with the in-memory copy of the DB file")
+    parser.add_argument("--profile", choices=sorted(ContactsDB._storage_profiles), default="interactive",
+                        help="storage profile (PRAGMA presets)")
+    parser.add_argument("--busy-timeout", type=float, default=5.0,
+                        help="seconds to wait for the DB locked by another process")
+    parser.add_argument("--stats", action="store_true", help="print DB statistics and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        db = ContactsDB(args.db, auto_save=False, profile=args.profile)
+        db_stats = db._stats()
+        if db_stats != -1:
+            print(ContactsDBInterface._stats_table(db_stats))
+    else:
+        """
+        Just create a class copy and call start() function
+        """
+        ui = ContactsDBInterface(db_name=args.db, auto_save=False, birthday_horizon=args.birthday_horizon,
+                                 in_memory=args.in_memory, profile=args.profile, busy_timeout=args.busy_timeout)
+        ui.start()
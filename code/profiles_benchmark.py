@@ -0,0 +1,60 @@
+"""
+Throughput of ContactsDB storage profiles: inserts (with a commit every {batch} records) and searches
+Usage: python profiles_benchmark.py [--records N] [--batch N] [--searches N]
+"""
+import argparse
+import random
+import tempfile
+import time
+from os import path
+from tabulate import tabulate as tb
+from lab1_phone_DB import ContactsDB
+
+
+def run_profile(profile, directory: str, records: int, batch: int, searches: int) -> tuple:
+    """
+    Fill a new DB with the profile and search in it
+    read_only_server DB is filled with bulk_load profile and reopened for the searches
+    :return: tuple(inserts per second or None, searches per second)
+    """
+    db_name = path.join(directory, str(profile) + ".sqlite")
+    write_profile = "bulk_load" if profile == "read_only_server" else profile
+    db = ContactsDB(db_name, auto_save=False, profile=write_profile)
+
+    start = time.perf_counter()
+    for first in range(0, records, batch):
+        with db._atomic():
+            for index in range(first, min(first + batch, records)):
+                db._insert_record(("Name" + str(index % 1000), "Surname" + str(index), "01-01-2000", index % 2),
+                                  ("8%010d" % index, "main"))
+        db.SQL_connection.commit()
+    inserts = records / (time.perf_counter() - start)
+
+    if profile == "read_only_server":
+        db.__del__()
+        db = ContactsDB(db_name, auto_save=False, profile=profile)
+        inserts = None
+
+    start = time.perf_counter()
+    for index in range(searches):
+        db._read({"first_name": "Name" + str(random.randrange(1000))}, "birthday")
+    found = searches / (time.perf_counter() - start)
+    db.__del__()
+    return inserts, found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ContactsDB storage profiles benchmark")
+    parser.add_argument("--records", type=int, default=5000, help="number of inserted records")
+    parser.add_argument("--batch", type=int, default=10, help="records per commit")
+    parser.add_argument("--searches", type=int, default=2000, help="number of searches")
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as directory:
+        for storage_profile in [None] + sorted(ContactsDB._storage_profiles):
+            inserts_speed, searches_speed = run_profile(storage_profile, directory,
+                                                        args.records, args.batch, args.searches)
+            rows.append((storage_profile or "SQLite defaults",
+                         round(inserts_speed) if inserts_speed is not None else "-", round(searches_speed)))
+    print(tb(rows, headers=("Profile", "Inserts/sec", "Searches/sec"), tablefmt='grid'))
@@ -0,0 +1,85 @@
+"""
+Write throughput with concurrent producers: every producer writes by its own ContactsDB connection
+(a commit per record) vs all producers write through one WriteQueue (group commit)
+Usage: python write_queue_benchmark.py [--records N] [--producers N [N ...]]
+"""
+import argparse
+import tempfile
+import threading
+import time
+from os import path
+from tabulate import tabulate as tb
+from lab1_phone_DB import ContactsDB, WriteQueue
+
+
+def record(producer: int, index: int) -> tuple:
+    return (("Name" + str(producer), "Surname" + str(index), "01-01-2000", index % 2),
+            ("8%03d%07d" % (producer, index), "main"))
+
+
+def run_producers(producers: int, records: int, write) -> float:
+    """
+    Run {producers} threads, every one writes {records} records by write(producer, index)
+    :return: records per second
+    """
+    threads = [threading.Thread(target=lambda producer=producer: [write(producer, index) for index in range(records)])
+               for producer in range(producers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return producers * records / (time.perf_counter() - start)
+
+
+def direct_writes(db_name: str, producers: int, records: int) -> float:
+    connections = list()
+    for producer in range(producers):
+        connections.append(ContactsDB(db_name, auto_save=False))
+        connections[-1].SQL_connection.commit()
+
+    def write(producer, index):
+        connections[producer]._insert_record(*record(producer, index))
+        connections[producer].SQL_connection.commit()
+
+    speed = run_producers(producers, records, write)
+    for db in connections:
+        db.__del__()
+    return speed
+
+
+def queued_writes(db_name: str, producers: int, records: int) -> float:
+    ContactsDB(db_name, auto_save=False).__del__()
+    write_queue = WriteQueue(db_name)
+    futures = list()
+
+    def write(producer, index):
+        futures.append(write_queue.insert_record(*record(producer, index)))
+
+    def write_all():
+        run_producers(producers, records, write)
+        for future in futures:
+            future.result()
+
+    start = time.perf_counter()
+    write_all()
+    speed = producers * records / (time.perf_counter() - start)
+    write_queue.close()
+    return speed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ContactsDB write queue benchmark")
+    parser.add_argument("--records", type=int, default=200, help="records per producer")
+    parser.add_argument("--producers", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of producers")
+    args = parser.parse_args()
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as directory:
+        for producers_number in args.producers:
+            rows.append((producers_number,
+                         round(direct_writes(path.join(directory, "direct%d.sqlite" % producers_number),
+                                             producers_number, args.records)),
+                         round(queued_writes(path.join(directory, "queued%d.sqlite" % producers_number),
+                                             producers_number, args.records))))
+    print(tb(rows, headers=("Producers", "Direct records/sec", "WriteQueue records/sec"), tablefmt='grid'))